@@ -0,0 +1,47 @@
+from timeit import Timer
+from games.codec import decode_game_state
+from games.codec import encode_game_state
+from games.render_profiles import sample_games
+
+
+def _time_per_call(function, repeat: int) -> float:
+    return min(Timer(function).repeat(repeat=5, number=repeat)) * 1_000_000 / repeat
+
+
+def codec_report(repeat: int = 10000) -> list[dict]:
+    """Compare the stored size and the encode and decode time of the JSON and binary game states"""
+    report = []
+    for game_name, game in sample_games().items():
+        json_state = game.serialize_to_json().encode()
+        binary_state = encode_game_state(game)
+        report.append({
+            'game': game_name,
+            'codec': 'json',
+            'bytes': len(json_state),
+            'encode_us': _time_per_call(game.serialize_to_json, repeat),
+            'decode_us': _time_per_call(lambda: decode_game_state(game.GAME_TYPE, json_state), repeat)
+        })
+        report.append({
+            'game': game_name,
+            'codec': 'binary',
+            'bytes': len(binary_state),
+            'encode_us': _time_per_call(lambda: encode_game_state(game), repeat),
+            'decode_us': _time_per_call(lambda: decode_game_state(game.GAME_TYPE, binary_state), repeat)
+        })
+    return report
+
+
+def get_benchmarks() -> dict:
+    benchmarks = dict()
+    for game_name, game in sample_games().items():
+        binary_state = encode_game_state(game)
+        benchmarks[f'codec.encode_game_state[{game_name}]'] = lambda game=game: encode_game_state(game)
+        benchmarks[f'codec.decode_game_state[{game_name}]'] = \
+            lambda game=game, binary_state=binary_state: decode_game_state(game.GAME_TYPE, binary_state)
+    return benchmarks
+
+
+if __name__ == '__main__':
+    print(f'{"game":<12}{"codec":<8}{"bytes":>8}{"encode us":>12}{"decode us":>12}')
+    for row in codec_report():
+        print(f'{row["game"]:<12}{row["codec"]:<8}{row["bytes"]:>8}{row["encode_us"]:>12.2f}{row["decode_us"]:>12.2f}')
@@ -0,0 +1,80 @@
+from decimal import Decimal
+from typing import Callable
+from games import roulette
+from games.assets import CARD_NAMES
+from games.blackjack import BlackJack
+from games.render_profiles import get_render_profile
+from games.render_service import get_image_key
+from games.roulette import Roulette
+
+_HAND_SIZES = range(2, 12)
+_CHIP_COUNTS = (1, 2, 4, 8, 16, 32, len(Roulette.BET_TYPES))
+
+
+def _blackjack_game(player_cards: int) -> BlackJack:
+    game = BlackJack()
+    game.state['bet_amount'] = Decimal('2500.00')
+    game.state['house_hand'] = list(CARD_NAMES[-2:])
+    game.state['player_hand'] = list(CARD_NAMES[:player_cards])
+    game.state['remaining_cards'] = list(CARD_NAMES[player_cards:-2])
+    return game
+
+
+def _roulette_game(chip_count: int) -> Roulette:
+    game = Roulette()
+    for bet_type in Roulette.BET_TYPES[:chip_count]:
+        if bet_type in Roulette.TABLE_NUMBERS:
+            game.add_inside_bet(bet_type, Decimal('250'))
+        else:
+            game.add_outside_bet(bet_type, Decimal('1000'))
+    return game
+
+
+def _render_roulette(game: Roulette, profile) -> Callable:
+    def render():
+        # Finished tables are cached by chip layout, without clearing them every call would be a cache hit
+        roulette._table_renderer.clear()
+        return game.create_table_image(profile)
+    return render
+
+
+def _play_roulette(game: Roulette) -> Callable:
+    def play():
+        game.payout = Decimal('0.00')
+        game.bet_hits = []
+        game.play()
+    return play
+
+
+def get_benchmarks() -> dict[str, Callable]:
+    profile = get_render_profile()
+    benchmarks = dict()
+    for player_cards in _HAND_SIZES:
+        game = _blackjack_game(player_cards)
+        benchmarks[f'blackjack.create_table_image[{player_cards} cards]'] = \
+            lambda game=game: game.create_table_image(profile)
+    for player_cards in (2, 5, 11):
+        hand = _blackjack_game(player_cards).state['player_hand']
+        benchmarks[f'blackjack._calculate_hand_value[{player_cards} cards]'] = \
+            lambda hand=hand: BlackJack()._calculate_hand_value(hand)
+
+    blackjack_game = _blackjack_game(3)
+    blackjack_json = blackjack_game.serialize_to_json()
+    benchmarks['blackjack.serialize_to_json'] = blackjack_game.serialize_to_json
+    benchmarks['blackjack.from_json'] = lambda: BlackJack.from_json(blackjack_json)
+
+    for chip_count in _CHIP_COUNTS:
+        benchmarks[f'roulette.create_table_image[{chip_count} chips]'] = \
+            _render_roulette(_roulette_game(chip_count), profile)
+    for chip_count in (1, len(Roulette.BET_TYPES)):
+        benchmarks[f'roulette.play[{chip_count} bets]'] = _play_roulette(_roulette_game(chip_count))
+
+    benchmarks['blackjack.get_image_key'] = lambda: get_image_key(blackjack_game, profile)
+    benchmarks['roulette.get_image_key[44 chips]'] = \
+        lambda game=_roulette_game(len(Roulette.BET_TYPES)): get_image_key(game, profile)
+
+    roulette_game = _roulette_game(8)
+    roulette_json = roulette_game.serialize_to_json()
+    benchmarks['roulette.serialize_to_json'] = roulette_game.serialize_to_json
+    benchmarks['roulette.from_json'] = lambda: Roulette.from_json(roulette_json)
+    return benchmarks
@@ -0,0 +1,124 @@
+import asyncio
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from typing import Callable
+from sqlalchemy import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import Session
+from games.active_games import ActiveGameRegistry
+from games.codec import encode_game_state
+from games.render_profiles import sample_games
+from models.database import create_engines
+from models.model import Base
+from models.model import Games
+from models.model import Job
+from models.model import Multipliers
+from models.model import Pet
+from models.model import User
+from utils.account_cache import account_cache
+from utils.formatting import format_money
+from utils.formatting import format_timedelta
+from utils.helpers import charge_user_async
+from utils.helpers import get_account_snapshot_async
+from utils.helpers import get_user_async
+from utils.helpers import pay_user_async
+from utils.helpers import reconcile_multipliers
+
+_GUILDS = 10
+_USERS_PER_GUILD = 500
+# The user every query benchmark looks up, in the middle of the table
+_GUILD_ID = _GUILDS // 2
+_DISCORD_ID = _USERS_PER_GUILD // 2
+
+
+def _seed(session: Session):
+    game_state = encode_game_state(sample_games()['blackjack'])
+    for guild_id in range(_GUILDS):
+        for discord_id in range(_USERS_PER_GUILD):
+            user = User(discord_id=discord_id, guild_id=guild_id, money=Decimal(1000 + discord_id),
+                        multiplier_total=Decimal('0.25'))
+            user.pet = Pet(current_owner_id=None, name=f'pet {discord_id}')
+            user.job = Job(title='Dealer', company='Casino')
+            user.multipliers.append(Multipliers(stat_multiplier=Decimal('0.25'), amount_owned=1,
+                                                degree_type='Bachelor', field='Mathematics'))
+            user.games.append(Games(game_type='blackjack', game_state=game_state))
+            session.add(user)
+    session.commit()
+
+
+class _SQLiteStandIn:
+    """A seeded SQLite database in a temporary directory, configured like the bot's SQLite backend"""
+
+    def __init__(self):
+        self.directory = tempfile.TemporaryDirectory()
+        database_path = os.path.join(self.directory.name, 'casino.db')
+        self.engine, async_engine = create_engines(make_url(f'sqlite:///{database_path}'))
+        Base.metadata.create_all(self.engine)
+        with Session(self.engine) as session:
+            _seed(session)
+        self.async_session = async_sessionmaker(async_engine, expire_on_commit=False)
+        # Its own registry, so the benchmarks never touch the games of the bot's database
+        self.active_games = ActiveGameRegistry(flush_interval=0, batch_size=0)
+        self.active_games.load(self.engine)
+        self.loop = asyncio.new_event_loop()
+
+    def run(self, query: Callable) -> Callable:
+        """Benchmark of query(session) in a new AsyncSession, rolled back so every call sees the same rows"""
+        async def run_query():
+            async with self.async_session() as session:
+                await query(session)
+                await session.rollback()
+        return lambda: self.loop.run_until_complete(run_query())
+
+    def run_sync(self, query: Callable) -> Callable:
+        def run_query():
+            with Session(self.engine) as session:
+                query(session)
+                session.rollback()
+        return run_query
+
+
+async def _get_snapshot_uncached(session: AsyncSession):
+    account_cache.invalidate(_GUILD_ID, _DISCORD_ID)
+    await get_account_snapshot_async(session, _DISCORD_ID, _GUILD_ID)
+
+
+async def _charge_user(session: AsyncSession):
+    await charge_user_async(session, await get_user_async(session, _DISCORD_ID, _GUILD_ID), Decimal('10'))
+
+
+async def _pay_user(session: AsyncSession):
+    await pay_user_async(session, await get_user_async(session, _DISCORD_ID, _GUILD_ID), Decimal('10'))
+
+
+def _stage_game(active_games: ActiveGameRegistry) -> Callable:
+    async def stage_game(session: AsyncSession):
+        user = await get_user_async(session, _DISCORD_ID, _GUILD_ID)
+        await active_games.stage(session, user, active_games.get(_GUILD_ID, _DISCORD_ID, 'blackjack'))
+    return stage_game
+
+
+def get_benchmarks() -> dict[str, Callable]:
+    benchmarks = dict()
+    for amount in (Decimal('7.5'), Decimal('1234567.89')):
+        benchmarks[f'format_money[{amount}]'] = lambda amount=amount: format_money(amount)
+    for duration in (timedelta(seconds=42), timedelta(hours=2, minutes=5, seconds=9)):
+        benchmarks[f'format_timedelta[{int(duration.total_seconds())}s]'] = \
+            lambda duration=duration: format_timedelta(duration)
+
+    database = _SQLiteStandIn()
+    benchmarks['active_games.get'] = lambda: database.active_games.get(_GUILD_ID, _DISCORD_ID, 'blackjack')
+    benchmarks['sqlite.active_games.stage'] = database.run(_stage_game(database.active_games))
+    benchmarks['sqlite.get_user_async'] = database.run(
+        lambda session: get_user_async(session, _DISCORD_ID, _GUILD_ID))
+    benchmarks['sqlite.get_account_snapshot_async[cached]'] = database.run(
+        lambda session: get_account_snapshot_async(session, _DISCORD_ID, _GUILD_ID))
+    benchmarks['sqlite.get_account_snapshot_async[uncached]'] = database.run(_get_snapshot_uncached)
+    benchmarks['sqlite.charge_user_async'] = database.run(_charge_user)
+    benchmarks['sqlite.pay_user_async'] = database.run(_pay_user)
+    benchmarks[f'sqlite.reconcile_multipliers[{_GUILDS * _USERS_PER_GUILD} users]'] = \
+        database.run_sync(reconcile_multipliers)
+    return benchmarks
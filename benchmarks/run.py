@@ -0,0 +1,120 @@
+import json
+import platform
+import subprocess
+import sys
+from argparse import ArgumentParser
+from datetime import datetime
+from datetime import timezone
+from importlib import import_module
+from locale import setlocale
+from locale import LC_ALL
+from os import getenv
+from statistics import median
+from timeit import Timer
+from typing import Callable
+from typing import Union
+from dotenv import load_dotenv
+
+# Every module exposes get_benchmarks(), returning a dict of benchmark name to a function taking no arguments
+_BENCHMARK_MODULES = ('benchmarks.bench_games', 'benchmarks.bench_helpers', 'benchmarks.bench_codec')
+
+
+def collect_benchmarks(name_filter: str = '') -> dict[str, Callable]:
+    benchmarks = dict()
+    for module_name in _BENCHMARK_MODULES:
+        for name, function in import_module(module_name).get_benchmarks().items():
+            if name_filter in name:
+                benchmarks[name] = function
+    return benchmarks
+
+
+def time_benchmark(function: Callable, repeat: int) -> dict:
+    timer = Timer(function)
+    # Enough calls per round that a round takes at least 0.2 seconds
+    number, _ = timer.autorange()
+    per_call = [round_seconds * 1_000_000 / number for round_seconds in timer.repeat(repeat=repeat, number=number)]
+    return {
+        'best_us': min(per_call),
+        'median_us': median(per_call),
+        'calls': number,
+        'repeat': repeat
+    }
+
+
+def run_benchmarks(benchmarks: dict[str, Callable], repeat: int) -> dict:
+    results = dict()
+    errors = dict()
+    for name, function in benchmarks.items():
+        try:
+            results[name] = time_benchmark(function, repeat)
+        except Exception as error:
+            errors[name] = f'{type(error).__name__}: {error}'
+            print(f'{name:<56}{"failed":>12}  {errors[name]}', file=sys.stderr)
+            continue
+        print(f'{name:<56}{results[name]["best_us"]:>12.2f} us')
+    return {
+        'commit': _get_commit(),
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'render_profile': getenv('CASINO_RENDER_PROFILE', 'lossless'),
+        'results': results,
+        'errors': errors
+    }
+
+
+def compare_results(baseline: dict, current: dict, threshold: float) -> list[str]:
+    """Print the change of every benchmark in both runs, returning the names that got slower than threshold"""
+    regressions = []
+    print(f'\n{"benchmark":<56}{"baseline us":>14}{"current us":>14}{"change":>10}')
+    for name, result in current['results'].items():
+        baseline_result = baseline['results'].get(name)
+        if baseline_result is None:
+            continue
+        # The best time of a run is the least disturbed by other work on the machine
+        change = result['best_us'] / baseline_result['best_us'] - 1
+        marker = ''
+        if change > threshold:
+            marker = '  slower'
+            regressions.append(name)
+        elif change < -threshold:
+            marker = '  faster'
+        print(f'{name:<56}{baseline_result["best_us"]:>14.2f}{result["best_us"]:>14.2f}{change:>+10.1%}{marker}')
+    print(f'baseline {baseline.get("commit") or "unknown"}, current {current.get("commit") or "unknown"}')
+    return regressions
+
+
+def _get_commit() -> Union[str | None]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit.strip()
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Time the games, rendering, formatting and database helpers')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare the results with a JSON file written by an earlier run')
+    parser.add_argument('--results', help='compare this JSON file with the baseline instead of running again')
+    parser.add_argument('--filter', default='', help='only run benchmarks whose name contains this text')
+    parser.add_argument('--repeat', type=int, default=5, help='timed rounds per benchmark')
+    parser.add_argument('--threshold', type=float, default=10, help='percent change reported as slower or faster')
+    arguments = parser.parse_args()
+
+    load_dotenv()
+    # format_money needs a locale with a currency, the same one the bot runs with
+    setlocale(LC_ALL, getenv('CASINO_LOCALE', 'en_US.UTF-8'))
+
+    if arguments.results:
+        with open(arguments.results) as results_file:
+            run = json.load(results_file)
+    else:
+        run = run_benchmarks(collect_benchmarks(arguments.filter), arguments.repeat)
+    if arguments.output:
+        with open(arguments.output, 'w') as output_file:
+            json.dump(run, output_file, indent=2)
+    if arguments.baseline:
+        with open(arguments.baseline) as baseline_file:
+            if compare_results(json.load(baseline_file), run, arguments.threshold / 100):
+                sys.exit(1)
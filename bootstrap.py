@@ -0,0 +1,102 @@
+import logging
+from contextlib import contextmanager
+from time import perf_counter
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    def __init__(self):
+        self.started = perf_counter()
+        self.steps: list[tuple[str, float]] = []
+
+    @contextmanager
+    def step(self, name: str):
+        step_started = perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append((name, perf_counter() - step_started))
+
+    def report(self) -> str:
+        steps = ', '.join(f'{name} {seconds:.2f}s' for name, seconds in self.steps)
+        return f'Started in {perf_counter() - self.started:.2f}s ({steps})'
+
+
+def create_bot():
+    import nextcord
+    from nextcord.ext import commands
+    from cogs.account import AccountManagement
+    from cogs.employment import Employment
+    from cogs.roulette_commands import RouletteCommands
+    from cogs.blackjack_commands import BlackjackCommands
+    from cogs.leaderboard_commands import LeaderboardCommands
+    from cogs.stats_commands import StatsCommands
+    from utils.metrics import finish_command
+    from utils.metrics import metrics_server
+    from utils.metrics import start_command
+    from utils.payroll import payroll
+
+    bot: nextcord.ext.commands.bot.Bot = commands.Bot()
+    bot.add_cog(AccountManagement(bot))
+    bot.add_cog(Employment(bot))
+    bot.add_cog(RouletteCommands(bot))
+    bot.add_cog(BlackjackCommands(bot))
+    bot.add_cog(LeaderboardCommands(bot))
+    bot.add_cog(StatsCommands(bot))
+
+    @bot.application_command_before_invoke
+    async def measure_command(interaction: nextcord.Interaction):
+        start_command(interaction.application_command.qualified_name)
+
+    @bot.application_command_after_invoke
+    async def record_command(_interaction: nextcord.Interaction):
+        finish_command()
+
+    @bot.event
+    async def on_ready():
+        await metrics_server.start()
+        payroll.start()
+
+    return bot
+
+
+def bootstrap():
+    """Prepare the database, the games and the render workers, then create the bot"""
+    timer = StartupTimer()
+    with timer.step('database'):
+        from models.migrations import run_migrations
+        from models.model import get_engine
+        engine = get_engine()
+        if run_migrations(engine):
+            logger.info('Checked and migrated the database schema')
+
+    with timer.step('active games'):
+        from games.active_games import active_games
+        active_games.load(engine)
+        # Not needed again until shutdown, and the render workers would otherwise inherit its connections
+        engine.dispose()
+
+    with timer.step('strategy table'):
+        from games.strategy import get_strategy_table
+        # Built once and cached on disk, loading it here keeps the first /blackjack command fast
+        get_strategy_table()
+
+    with timer.step('render workers'):
+        from games.render_service import render_service
+        # Forked before the bot is created and opens any sockets or threads
+        render_service.start()
+
+    with timer.step('bot'):
+        bot = create_bot()
+    logger.info(timer.report())
+    return bot
+
+
+def shutdown():
+    from games.active_games import active_games
+    from games.render_service import render_service
+    from models.model import get_engine
+
+    active_games.write_pending(get_engine())
+    render_service.shutdown()
@@ -2,17 +2,20 @@ from typing import Union
 from datetime import datetime
 import nextcord
 from nextcord.ext import commands
-from models.model import engine
+from models.model import async_session
 from models.model import User
 from models.model import Pet
 from models.model import MONEY_DEFAULT
 from models.model import PET_PRICE_DEFAULT
-from sqlalchemy.orm import Session
-from utils.helpers import get_user
-from utils.helpers import format_money
+from sqlalchemy.ext.asyncio import AsyncSession
+from utils.account_cache import AccountSnapshot
+from utils.helpers import get_user_async
+from utils.helpers import get_account_snapshot_async
+from utils.formatting import format_money
 from utils.helpers import get_multipliers
 from utils.helpers import send_response
 from utils.helpers import send_error_message
+from utils.locks import user_lock
 from decimal import Decimal
 from random import randint
 
@@ -38,21 +41,21 @@ class AccountManagement(commands.Cog):
         pet_name: str
             The name of your ✨adorable✨ pet 😉
         """
-        with Session(engine) as session:
-            user: Union[User | None] = get_user(session, interaction.user.id, interaction.guild.id)
+        async with user_lock(interaction), async_session() as session:
+            user: Union[User | None] = await get_user_async(session, interaction.user.id, interaction.guild.id)
             user_not_exist: bool = user is None
             if user_not_exist:
                 pet_name = pet_name.capitalize()
                 self.create_user(session, interaction.user.id, interaction.guild.id, pet_name)
+                await session.commit()
                 await self.send_welcome_message(interaction, pet_name)
-                session.commit()
                 return
             else:
                 await send_error_message(interaction, 'Error Creating Account', 'Your account already exists')
                 return
 
     @staticmethod
-    def create_user(session: Session, discord_id: int, guild_id: int, pet_name):
+    def create_user(session: AsyncSession, discord_id: int, guild_id: int, pet_name):
         new_user: User = User(discord_id=discord_id, guild_id=guild_id)
         new_user.pet = Pet(current_owner_id=None, name=pet_name)
         session.add(new_user)
@@ -83,39 +86,40 @@ class AccountManagement(commands.Cog):
         user:
             User's account you want to see
         """
-        with Session(engine) as session:
-            user: Union[User | None] = get_user(session, member.id, member.guild.id)
-            user_exists = user is not None
+        async with async_session() as session:
+            account: Union[AccountSnapshot | None] = await get_account_snapshot_async(session, member.id,
+                                                                                       member.guild.id)
+            user_exists = account is not None
             if user_exists:
-                await self.send_account_info(interaction, user, member.display_name)
+                await self.send_account_info(interaction, account, member.display_name)
             else:
                 await send_error_message(interaction, 'Error Querying Account',
                                          f'{member.display_name} has not created an account yet.')
 
     @staticmethod
-    async def send_account_info(interaction: nextcord.Interaction, user: User, display_name: str):
-        has_job: bool = user.job is not None
+    async def send_account_info(interaction: nextcord.Interaction, account: AccountSnapshot, display_name: str):
+        has_job: bool = account.job_title is not None
 
         response = nextcord.Embed(title=f"{display_name} Account Info", color=0x00e1ff)
 
-        response.add_field(name=f"Pet Name", value=f"```\n{user.pet.name}\n```", inline=True)
-        if user.pet.current_owner is None:
+        response.add_field(name=f"Pet Name", value=f"```\n{account.pet_name}\n```", inline=True)
+        if account.pet_owner_discord_id is None:
             pet_status = '```\nKidnapped by Bot\n```'
-        elif user.pet.current_owner is user:
+        elif account.pet_owner_discord_id == account.discord_id:
             pet_status = '```\nSafe\n```'
         else:
-            pet_status = f'Kidnapped by @<{user.pet.current_owner.discord_id}>'
+            pet_status = f'Kidnapped by @<{account.pet_owner_discord_id}>'
         response.add_field(name=f"Pet Status", value=pet_status, inline=True)
 
         if has_job:
-            response.add_field(name=f"Job Title", value=f"```\n{user.job.title}\n```", inline=False)
-            response.add_field(name=f"Company Name", value=f"```\n{user.job.company}\n```", inline=False)
+            response.add_field(name=f"Job Title", value=f"```\n{account.job_title}\n```", inline=False)
+            response.add_field(name=f"Company Name", value=f"```\n{account.job_company}\n```", inline=False)
         else:
             response.add_field(name=f"Job Title", value=f"```\nUnemployed\n```", inline=False)
             response.add_field(name=f"Company Name", value=f"```\nUnemployed\n```", inline=False)
-        response.add_field(name=f"Account Balance", value=f"```\n{format_money(user.money)}\n```", inline=True)
+        response.add_field(name=f"Account Balance", value=f"```\n{format_money(account.money)}\n```", inline=True)
 
-        total_multipliers: Decimal = get_multipliers(user)
+        total_multipliers: Decimal = get_multipliers(account)
         response.add_field(name=f"Paycheck Multiplier", value=f"```\n{total_multipliers:.0%}\n```", inline=True)
 
         await send_response(interaction, embed=response)
@@ -1,18 +1,23 @@
+import asyncio
 import nextcord
 from nextcord.ext import commands
+from games.active_games import active_games
 from games.blackjack import BlackJack
-from models.model import engine
+from games.render_service import render_service
+from games.strategy import Hint
+from games.strategy import get_strategy_table
+from models.model import async_session
 from models.model import User
-from models.model import Games
-from utils.helpers import get_user
+from utils.helpers import defer_response
+from utils.helpers import get_user_async
 from utils.helpers import send_error_message
 from utils.helpers import send_response
-from utils.helpers import get_active_game
-from utils.helpers import register_new_game
-from utils.helpers import format_money
-from utils.helpers import charge_user
-from utils.helpers import pay_user
-from sqlalchemy.orm import Session
+from utils.helpers import send_table_response
+from utils.formatting import format_money
+from utils.helpers import charge_user_async
+from utils.helpers import pay_user_async
+from utils.locks import user_lock
+from sqlalchemy.ext.asyncio import AsyncSession
 from decimal import Decimal
 from typing import Union
 
@@ -55,9 +60,65 @@ class BlackjackCommands(commands.Cog):
         """Use this command to draw another card"""
         await self.play_game(interaction, 'hit')
 
+    @blackjack.subcommand()
+    async def hint(self, interaction: nextcord.Interaction):
+        """Use this command to find out which move wins you the most money on average"""
+        blackjack_game: Union[BlackJack | None] = active_games.get(interaction.guild.id, interaction.user.id,
+                                                                   BlackJack.GAME_TYPE)
+        if blackjack_game is None:
+            await send_error_message(interaction, 'Error Getting Blackjack Hint',
+                                     f'You do not have an active Blackjack game. '
+                                     f'Start a Blackjack game before asking for a hint.')
+            return
+
+        hint = self.get_hint(blackjack_game)
+        bet_amount = blackjack_game.state['bet_amount']
+        response = nextcord.Embed(title=f"Blackjack Hint", color=0x00e1ff)
+        response.add_field(name=f"Best Move", value=f"```\n{hint.best_move.title()}\n```", inline=True)
+        response.add_field(name=f"House Bust Chance", value=f"```\n{hint.house_bust_chance:.1%}\n```", inline=True)
+        for move, expected_return in (('Stand', hint.stand), ('Hit', hint.hit), ('Double Down', hint.double_down)):
+            if expected_return is not None:
+                response.add_field(name=f"Average Result of {move}",
+                                   value=f"```\n{format_money(bet_amount * Decimal(expected_return))}\n```",
+                                   inline=False)
+        await send_response(interaction, embed=response)
+
+    @staticmethod
+    def get_hint(black_jack_game: BlackJack) -> Hint:
+        return get_strategy_table().get_hint(black_jack_game.state['player_hand'],
+                                             black_jack_game.state['house_hand'][0],
+                                             black_jack_game.state['can_double_down'])
+
     async def play_game(self, interaction, action: str, bet_amount: Decimal = Decimal(0)):
-        with Session(engine) as session:
-            user: Union[User | None] = get_user(session, interaction.user.id, interaction.guild.id)
+        # Every action answers with a rendered table, which together with the database work can take longer than
+        # Discord waits for the first response
+        await defer_response(interaction)
+        async with user_lock(interaction):
+            game_state = await self.update_game(interaction, action, bet_amount)
+        if game_state is not None:
+            # Awaited after releasing the lock, so the next action of the user can supersede a table still queued
+            response, table_image = game_state
+            await send_table_response(interaction, response, table_image,
+                                      f'blackjack.{render_service.profile.extension}')
+
+    async def update_game(self, interaction: nextcord.Interaction, action: str,
+                          bet_amount: Decimal) -> Union[tuple[nextcord.Embed, asyncio.Future] | None]:
+        """Apply the action, returning the response and its queued table, or None once an error was sent"""
+        blackjack_game: Union[BlackJack | None] = active_games.get(interaction.guild.id, interaction.user.id,
+                                                                   BlackJack.GAME_TYPE)
+        if blackjack_game is not None and action == 'start':
+            return self.create_game_state_embed(blackjack_game), await self.submit_table(interaction, blackjack_game)
+
+        if blackjack_game is not None and action == 'hit':
+            blackjack_game.hit_player()
+            if not blackjack_game.state['game_ended']:
+                # Nothing to pay out yet, so the new card is written behind without touching the database
+                active_games.save(interaction.guild.id, interaction.user.id, blackjack_game)
+                return (self.create_game_state_embed(blackjack_game),
+                        await self.submit_table(interaction, blackjack_game))
+
+        async with async_session() as session:
+            user: Union[User | None] = await get_user_async(session, interaction.user.id, interaction.guild.id)
             user_not_exist: bool = user is None
 
             if user_not_exist:
@@ -65,65 +126,67 @@ class BlackjackCommands(commands.Cog):
                                          'You can not play any casino games before creating an account')
                 return
 
-            insufficient_funds = user.money < bet_amount
-            if insufficient_funds:
-                await send_error_message(interaction, 'Error Playing Blackjack Game',
-                                         f'You are too broke to make this bet. '
-                                         f'Come back when you have {format_money(bet_amount)}.')
-                return
-
-            game: Union[Games | None] = get_active_game(user, BlackJack.GAME_TYPE)
-            if game is None and action != 'start':
+            if blackjack_game is None and action != 'start':
                 await send_error_message(interaction, 'Error Playing Blackjack Game',
                                          f'You do not have an active Blackjack game. '
                                          f'Start a Blackjack game before using this action.')
                 return
 
             if action == 'start':
-                if game is None:
-                    await self.start_blackjack_game(interaction, user, bet_amount)
-                    session.commit()
-                    return
-                else:
-                    await self.send_game_state(interaction, BlackJack.from_json(game.game_state), user)
+                blackjack_game = BlackJack()
+                blackjack_game.start_game(bet_amount)
+                insufficient_funds = not await self.start_blackjack_game(session, user, blackjack_game)
+                if insufficient_funds:
+                    await send_error_message(interaction, 'Error Playing Blackjack Game',
+                                             f'You are too broke to make this bet. '
+                                             f'Come back when you have {format_money(bet_amount)}.')
                     return
+                table_image = await self.submit_table(interaction, blackjack_game, wait=False)
+                await session.commit()
+                return self.create_game_state_embed(blackjack_game, user), \
+                    table_image or await self.submit_table(interaction, blackjack_game)
 
-            blackjack_game = BlackJack.from_json(game.game_state)
             if action == 'double down':
-                insufficient_funds = user.money < blackjack_game.state['bet_amount']
+                insufficient_funds = await charge_user_async(session, user,
+                                                             blackjack_game.state['bet_amount']) is None
                 if insufficient_funds:
                     await send_error_message(interaction, 'Error Doubling Down',
                                              f"You do not have enough money to double down. "
                                              f"Come back when you have {blackjack_game.state['bet_amount']}.")
                     return
-                charge_user(user, blackjack_game.state['bet_amount'])
                 blackjack_game.double_down()
 
-            if action == 'hit':
-                blackjack_game.hit_player()
-
             if action == 'stand':
                 blackjack_game.stand()
 
+            # Renders while the result is written, a full render queue is only waited for after the commit so it never
+            # keeps the balance row locked
+            table_image = await self.submit_table(interaction, blackjack_game, wait=False)
             if blackjack_game.state['game_ended']:
                 if blackjack_game.state['payout'] > Decimal(0.00):
-                    pay_user(user, blackjack_game.state['payout'])
-                session.delete(game)
+                    await pay_user_async(session, user, blackjack_game.state['payout'])
+                await active_games.stage_removal(session, user, BlackJack.GAME_TYPE)
             else:
-                game.game_state = blackjack_game.serialize_to_json()
-            await self.send_game_state(interaction, blackjack_game, user)
-            session.commit()
+                await active_games.stage(session, user, blackjack_game)
+            await session.commit()
+            return self.create_game_state_embed(blackjack_game, user), \
+                table_image or await self.submit_table(interaction, blackjack_game)
+
+    @staticmethod
+    async def start_blackjack_game(session: AsyncSession, user: User, blackjack_game: BlackJack) -> bool:
+        """Charge the bet of a freshly dealt game and stage it, returning False if the user can not afford it"""
+        if await charge_user_async(session, user, blackjack_game.state['bet_amount']) is None:
+            return False
+        await active_games.stage(session, user, blackjack_game)
+        return True
 
     @staticmethod
-    async def start_blackjack_game(interaction: nextcord.Interaction, user: User, bet_amount: Decimal):
-        blackjack_game = BlackJack()
-        charge_user(user, bet_amount)
-        blackjack_game.start_game(bet_amount)
-        register_new_game(user, BlackJack.GAME_TYPE, blackjack_game.serialize_to_json())
-        await BlackjackCommands.send_game_state(interaction, blackjack_game, user)
+    async def submit_table(interaction: nextcord.Interaction, black_jack_game: BlackJack,
+                           wait: bool = True) -> Union[asyncio.Future | None]:
+        return await render_service.submit(black_jack_game, interaction.guild.id, interaction.user.id, wait)
 
     @staticmethod
-    async def send_game_state(interaction: nextcord.Interaction, black_jack_game: BlackJack, user: User):
+    def create_game_state_embed(black_jack_game: BlackJack, user: User = None) -> nextcord.Embed:
         if black_jack_game.state['game_ended']:
             response = nextcord.Embed(title=f"Blackjack Game Ended!", color=0x00e1ff)
             response.add_field(name=f"Bet Placed",
@@ -133,9 +196,12 @@ class BlackjackCommands(commands.Cog):
                                value=f"```\n{format_money(black_jack_game.state['payout'])}\n```",
                                inline=True)
             response.add_field(name="Account Balance", value=f"```\n{format_money(user.money)}\n```", inline=False)
-
-            await send_response(interaction, embed=response, file=nextcord.File(fp=black_jack_game.create_table_image(),
-                                                                                filename='blackjack.png'))
         else:
-            await send_response(interaction, file=nextcord.File(fp=black_jack_game.create_table_image(),
-                                                                filename='blackjack.png'))
+            hint = BlackjackCommands.get_hint(black_jack_game)
+            response = nextcord.Embed(title=f"Blackjack Game In Progress", color=0x00e1ff)
+            response.add_field(name=f"Bet Placed",
+                               value=f"```\n{format_money(black_jack_game.state['bet_amount'])}\n```",
+                               inline=True)
+            response.add_field(name=f"House Bust Chance", value=f"```\n{hint.house_bust_chance:.1%}\n```",
+                               inline=True)
+        return response
@@ -4,23 +4,25 @@ from nextcord.ext import commands
 from models.model import User
 from models.model import Job
 from models.model import Multipliers
-from models.model import engine
-from sqlalchemy.orm import Session
-from utils.helpers import get_user
-from utils.helpers import pay_user
-from utils.helpers import charge_user
+from models.model import async_session
+from sqlalchemy.ext.asyncio import AsyncSession
+from utils.helpers import get_user_async
+from utils.helpers import pay_user_async
+from utils.helpers import charge_user_async
+from utils.helpers import add_multiplier_async
 from utils.helpers import send_error_message
 from utils.helpers import send_response
-from utils.helpers import format_money
-from utils.helpers import format_timedelta
+from utils.formatting import format_money
+from utils.formatting import format_timedelta
 from utils.helpers import get_multipliers
+from utils.locks import user_lock
+from utils.payroll import BASE_PAY
+from utils.payroll import PAYCHECK_INTERVAL
+from utils.payroll import claim_paycheck_async
 from datetime import datetime
 from datetime import timedelta
 from decimal import Decimal
 
-PAYCHECK_INTERVAL: timedelta = timedelta(minutes=10)
-BASE_PAY: Decimal = Decimal('100')
-
 
 class Employment(commands.Cog):
     degrees = {
@@ -36,7 +38,7 @@ class Employment(commands.Cog):
         },
         'bootcamp': {
             'price': Decimal("750"),
-            'stat': 0.75,
+            'stat': Decimal("0.75"),
             'friendly_name': 'Bootcamp Certification of Completion'
         }
     }
@@ -62,8 +64,8 @@ class Employment(commands.Cog):
         company_name: str
             The name of the company you want to apply to
         """
-        with Session(engine) as session:
-            user: Union[User | None] = get_user(session, interaction.user.id, interaction.guild.id)
+        async with user_lock(interaction), async_session() as session:
+            user: Union[User | None] = await get_user_async(session, interaction.user.id, interaction.guild.id)
             user_not_exist: bool = user is None
 
             if user_not_exist:
@@ -72,8 +74,8 @@ class Employment(commands.Cog):
                 return
 
             self.create_job(user, job_title, company_name)
+            await session.commit()
             await self.send_job_response(interaction, user)
-            session.commit()
 
     @staticmethod
     def create_job(user: User, job_title: str, company_name: str):
@@ -99,8 +101,8 @@ class Employment(commands.Cog):
     @job.subcommand()
     async def paycheck(self, interaction: nextcord.Interaction):
         """Use this command to ✨get paid✨ daily"""
-        with Session(engine) as session:
-            user: Union[User | None] = get_user(session, interaction.user.id, interaction.guild.id)
+        async with user_lock(interaction), async_session() as session:
+            user: Union[User | None] = await get_user_async(session, interaction.user.id, interaction.guild.id)
 
             user_not_exist: bool = user is None
             if user_not_exist:
@@ -124,12 +126,18 @@ class Employment(commands.Cog):
                                          f'for your next paycheck.')
                 return
 
+            paycheck_already_paid = not await claim_paycheck_async(session, user.job, utc_time_now)
+            if paycheck_already_paid:
+                await send_error_message(interaction, 'Error Receiving Paycheck',
+                                         'The payroll has just paid your paycheck into your account.')
+                return
+
             multipliers: Decimal = get_multipliers(user)
             paycheck_amount: Decimal = multipliers * BASE_PAY
-            pay_user(user, paycheck_amount)
-            user.job.paycheck_redeemed = utc_time_now
+            await pay_user_async(session, user, paycheck_amount)
+            # Committed before responding, so the balance row is not locked while talking to Discord
+            await session.commit()
             await self.send_paycheck_response(interaction, user, paycheck_amount, multipliers)
-            session.commit()
 
     @staticmethod
     async def send_paycheck_response(interaction: nextcord.Interaction, user: User, amount: Decimal,
@@ -159,8 +167,8 @@ class Employment(commands.Cog):
         amount:
             The amount of degrees you want to purchase
         """
-        with Session(engine) as session:
-            user: Union[User | None] = get_user(session, interaction.user.id, interaction.guild.id)
+        async with user_lock(interaction), async_session() as session:
+            user: Union[User | None] = await get_user_async(session, interaction.user.id, interaction.guild.id)
             total_cost: Decimal = Employment.degrees[degree_type]['price'] * amount
             total_multiplier: Decimal = Employment.degrees[degree_type]['stat'] * amount
             degree_name: str = Employment.degrees[degree_type]['friendly_name'] + ("s" if amount == 1 else '')
@@ -171,22 +179,24 @@ class Employment(commands.Cog):
                                          'You can not purchase a degree before creating an account')
                 return
 
-            insufficient_funds: bool = user.money < total_cost
+            insufficient_funds: bool = await charge_user_async(session, user, total_cost) is None
             if insufficient_funds:
                 await send_error_message(interaction, 'Error Purchasing Degree',
                                          f'You are too broke to buy {amount} {degree_name} in {field}. '
                                          f'Come back when you have {format_money(total_cost)}.')
                 return
 
-            charge_user(user, total_cost)
-            self.create_multiplier(user, total_multiplier, amount, degree_type, field)
+            await self.create_multiplier(session, user, total_multiplier, amount, degree_type, field)
+            await session.commit()
             await self.send_degree_purchase_response(interaction, user, amount, total_cost, degree_name, field)
-            session.commit()
 
     @staticmethod
-    def create_multiplier(user: User, multiplier: Decimal, amount: int, degree_type: str, field: str):
-        user.multipliers.append(
-            Multipliers(stat_multiplier=multiplier, amount_owned=amount, degree_type=degree_type, field=field))
+    async def create_multiplier(session: AsyncSession, user: User, multiplier: Decimal, amount: int,
+                                degree_type: str, field: str):
+        # Added through the session because appending to the unloaded user.multipliers would need a lazy load
+        session.add(Multipliers(user=user, stat_multiplier=multiplier, amount_owned=amount, degree_type=degree_type,
+                                field=field))
+        await add_multiplier_async(session, user, multiplier)
 
     @staticmethod
     async def send_degree_purchase_response(interaction: nextcord.Interaction,
@@ -0,0 +1,29 @@
+import nextcord
+from nextcord.ext import commands
+from models.model import async_session
+from utils.formatting import format_money
+from utils.helpers import send_error_message
+from utils.helpers import send_response
+from utils.leaderboard import LEADERBOARD_LENGTH
+from utils.leaderboard import leaderboards
+
+
+class LeaderboardCommands(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    @nextcord.slash_command()
+    async def leaderboard(self, interaction: nextcord.Interaction):
+        """Use this command to see the richest players in this server"""
+        async with async_session() as session:
+            top_players = await leaderboards.get_top(session, interaction.guild.id, LEADERBOARD_LENGTH)
+
+        if len(top_players) == 0:
+            await send_error_message(interaction, 'Error Showing Leaderboard',
+                                     'Nobody in this server has created an account yet')
+            return
+
+        response = nextcord.Embed(title=f"Richest Players", color=0x00e1ff)
+        response.description = '\n'.join(f"**{rank}.** <@{discord_id}> {format_money(money)}"
+                                         for rank, (discord_id, money) in enumerate(top_players, start=1))
+        await send_response(interaction, embed=response)
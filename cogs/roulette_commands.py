@@ -1,19 +1,21 @@
+import asyncio
 import nextcord
 from typing import Union
 from nextcord.ext import commands
+from games.active_games import active_games
 from games.roulette import Roulette
+from games.render_service import render_service
 from models.model import User
-from models.model import Games
-from models.model import engine
-from utils.helpers import get_user
-from utils.helpers import charge_user
-from utils.helpers import pay_user
+from models.model import async_session
+from utils.helpers import defer_response
+from utils.helpers import get_user_async
+from utils.helpers import charge_user_async
+from utils.helpers import pay_user_async
 from utils.helpers import send_error_message
 from utils.helpers import send_response
-from utils.helpers import get_active_game
-from utils.helpers import format_money
-from utils.helpers import register_new_game
-from sqlalchemy.orm import Session
+from utils.helpers import send_table_response
+from utils.formatting import format_money
+from utils.locks import user_lock
 from decimal import Decimal
 
 
@@ -46,8 +48,22 @@ class RouletteCommands(commands.Cog):
         await self.place_bet(interaction, bet_type, Decimal(bet_amount))
 
     async def place_bet(self, interaction: nextcord.Interaction, bet_type: str, bet_amount: Decimal):
-        with Session(engine) as session:
-            user: Union[User | None] = get_user(session, interaction.user.id, interaction.guild.id)
+        # The table with every chip is rendered for the response, which can take longer than Discord waits for it
+        await defer_response(interaction)
+        async with user_lock(interaction):
+            bet_placed = await self.stage_bet(interaction, bet_type, bet_amount)
+        if bet_placed is not None:
+            # Awaited after releasing the lock, so the next bet of the user can supersede a table still queued
+            response, table_image = bet_placed
+            await send_table_response(interaction, response, table_image,
+                                      f'roulette bets.{render_service.profile.extension}')
+
+    @staticmethod
+    async def stage_bet(interaction: nextcord.Interaction, bet_type: str,
+                        bet_amount: Decimal) -> Union[tuple[nextcord.Embed, asyncio.Future] | None]:
+        """Charge and place the bet, returning the response and its queued table, or None once an error was sent"""
+        async with async_session() as session:
+            user: Union[User | None] = await get_user_async(session, interaction.user.id, interaction.guild.id)
             user_not_exist: bool = user is None
 
             if user_not_exist:
@@ -55,38 +71,37 @@ class RouletteCommands(commands.Cog):
                                          'You can not play any casino games before creating an account')
                 return
 
-            insufficient_funds = user.money < bet_amount
+            insufficient_funds = await charge_user_async(session, user, bet_amount) is None
             if insufficient_funds:
                 await send_error_message(interaction, 'Error Making Roulette Bet',
                                          f'You are too broke to make this bet. '
                                          f'Come back when you have {format_money(bet_amount)}.')
                 return
 
-            game: Union[Games | None] = get_active_game(user, Roulette.GAME_TYPE)
-            if game is None:
+            roulette_game: Union[Roulette | None] = active_games.get(user.guild_id, user.discord_id,
+                                                                     Roulette.GAME_TYPE)
+            if roulette_game is None:
                 roulette_game = Roulette()
-                game = register_new_game(user, Roulette.GAME_TYPE, roulette_game.serialize_to_json())
-            else:
-                roulette_game = Roulette.from_json(game.game_state)
 
             if bet_type in Roulette.TABLE_NUMBERS:
                 roulette_game.add_inside_bet(bet_type, bet_amount)
             elif bet_type in Roulette.OUTSIDE_BETS:
                 roulette_game.add_outside_bet(bet_type, bet_amount)
 
-            charge_user(user, bet_amount)
-            game.game_state = roulette_game.serialize_to_json()
-            await self.send_bet_placed_response(interaction, user, roulette_game)
-            session.commit()
+            # Renders while the bet is written, a full render queue is only waited for after the commit
+            table_image = await render_service.submit(roulette_game, user.guild_id, user.discord_id, wait=False)
+            await active_games.stage(session, user, roulette_game)
+            await session.commit()
+            return RouletteCommands.create_bet_placed_embed(user, roulette_game), \
+                table_image or await render_service.submit(roulette_game, user.guild_id, user.discord_id)
 
     @staticmethod
-    async def send_bet_placed_response(interaction: nextcord.Interaction, user: User, roulette_game: Roulette):
+    def create_bet_placed_embed(user: User, roulette_game: Roulette) -> nextcord.Embed:
         response = nextcord.Embed(title=f"Bet Placed!", color=0x00e1ff)
         response.add_field(name=f"Total Bets Placed", value=f"```\n{format_money(roulette_game.bet_total)}\n```",
                            inline=True)
         response.add_field(name="Account Balance", value=f"```\n{format_money(user.money)}\n```", inline=True)
-        await send_response(interaction, embed=response, file=nextcord.File(fp=roulette_game.create_table_image(),
-                                                                            filename='roulette bets.png'))
+        return response
 
     @roulette.subcommand()
     async def inside_bet(self,
@@ -107,8 +122,8 @@ class RouletteCommands(commands.Cog):
     @roulette.subcommand()
     async def spin(self, interaction: nextcord.Interaction):
         """Use this command to spin the roulette and win some money!"""
-        with Session(engine) as session:
-            user: Union[User | None] = get_user(session, interaction.user.id, interaction.guild.id)
+        async with user_lock(interaction), async_session() as session:
+            user: Union[User | None] = await get_user_async(session, interaction.user.id, interaction.guild.id)
 
             user_not_exist: bool = user is None
             if user_not_exist:
@@ -116,19 +131,19 @@ class RouletteCommands(commands.Cog):
                                          'You can not play any casino games before creating an account')
                 return
 
-            game: Union[Games | None] = get_active_game(user, Roulette.GAME_TYPE)
-            if game is None:
+            roulette_game: Union[Roulette | None] = active_games.get(user.guild_id, user.discord_id,
+                                                                     Roulette.GAME_TYPE)
+            if roulette_game is None:
                 await send_error_message(interaction, 'Error Spinning Roulette',
                                          'You can not spin the roulette until you have placed a bet.')
                 return
 
-            roulette_game = Roulette.from_json(game.game_state)
             roulette_game.play()
 
             if roulette_game.payout > Decimal(0.00):
-                pay_user(user, roulette_game.payout)
-            session.delete(game)
-            session.commit()
+                await pay_user_async(session, user, roulette_game.payout)
+            await active_games.stage_removal(session, user, Roulette.GAME_TYPE)
+            await session.commit()
             await self.send_roulette_spin_response(interaction, user, roulette_game)
 
     @staticmethod
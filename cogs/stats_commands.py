@@ -0,0 +1,92 @@
+import nextcord
+from nextcord.ext import commands
+from games.active_games import active_games
+from games.render_service import render_service
+from utils.account_cache import account_cache
+from utils.helpers import send_error_message
+from utils.helpers import send_response
+from utils.leaderboard import leaderboards
+from utils.payroll import payroll
+from utils import metrics
+
+# An embed holds at most 25 fields
+_MAX_COMMANDS_SHOWN = 25
+
+
+class StatsCommands(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    @nextcord.slash_command(default_member_permissions=nextcord.Permissions(administrator=True), dm_permission=False)
+    async def casino(self, interaction: nextcord.Interaction):
+        """
+        Main command for bot administration subcommands
+        """
+        pass
+
+    @casino.subcommand()
+    async def stats(self, interaction: nextcord.Interaction):
+        """Use this command to see how long each command takes and where the time goes"""
+        # Server admins can grant the command to other members, the stats stay with administrators regardless
+        if not interaction.user.guild_permissions.administrator:
+            await send_error_message(interaction, 'Error Showing Stats', 'Only server administrators can see the stats')
+            return
+
+        account_stats = account_cache.stats()
+        image_stats = render_service.image_cache_stats()
+        response = nextcord.Embed(title='Casino Stats', color=0x00e1ff)
+        response.description = f"```\n" \
+                               f"Account cache:  {account_stats['entries']} entries, " \
+                               f"{account_stats['hit_rate']:.1%} hit rate\n" \
+                               f"Leaderboards:   {leaderboards.stats()['guilds']} servers\n" \
+                               f"Unsaved games:  {active_games.pending_writes}\n" \
+                               f"Render queue:   {render_service.queue_depth} of {render_service.max_queued}\n" \
+                               f"Image cache:    {image_stats['entries']} images, " \
+                               f"{image_stats['bytes'] / 1024 / 1024:.1f} MiB, " \
+                               f"{image_stats['hit_rate']:.1%} hit rate\n" \
+                               f"Payroll:        {self.format_payroll_stats()}\n```"
+
+        busiest_commands = sorted(metrics.command_seconds.commands(), key=metrics.command_seconds.count,
+                                  reverse=True)[0:_MAX_COMMANDS_SHOWN]
+        for command in busiest_commands:
+            response.add_field(name=f'/{command}', value=self.format_command_stats(command), inline=False)
+        if not busiest_commands:
+            response.add_field(name='Commands', value='No command has finished since the bot started')
+        response.set_footer(text='Database, Discord and render times are averages per call')
+        await send_response(interaction, embed=response, ephemeral=True)
+
+    @staticmethod
+    def format_payroll_stats() -> str:
+        payroll_stats = payroll.stats()
+        if not payroll_stats['enabled']:
+            return 'off'
+        if payroll_stats['last_run'] is None:
+            return 'not run yet'
+        return f"{payroll_stats['users_paid']} paid in the last run, " \
+               f"{payroll_stats['users_per_second']:.0f} users per second"
+
+    @staticmethod
+    def format_command_stats(command: str) -> str:
+        calls = metrics.command_seconds.count(command)
+        lines = [
+            f'calls    {calls}',
+            f'total    p50 {metrics.command_seconds.quantile(command, 0.5) * 1000:.0f} ms, '
+            f'p95 {metrics.command_seconds.quantile(command, 0.95) * 1000:.0f} ms',
+            f'database {metrics.db_seconds.total(command) / calls * 1000:.1f} ms, '
+            f'{metrics.db_queries.total(command) / calls:.1f} queries',
+            f'discord  {metrics.response_seconds.total(command) / calls * 1000:.0f} ms'
+        ]
+        deferred = metrics.deferred_responses.count(command)
+        if deferred:
+            lines.append(f'deferred {deferred}, {metrics.late_responses.count(command)} needed it')
+        renders = metrics.render_seconds.count(command)
+        if renders:
+            lines.append(f'render   {metrics.render_seconds.total(command) / renders * 1000:.0f} ms')
+        uploads = metrics.image_bytes.count(command)
+        if uploads:
+            lines.append(f'images   {metrics.image_bytes.total(command) / uploads / 1024:.0f} KiB, '
+                         f'{metrics.cached_images.count(command)} from the cache')
+        superseded = metrics.superseded_renders.count(command)
+        if superseded:
+            lines.append(f'skipped  {superseded} tables superseded by a newer action')
+        return '```\n' + '\n'.join(lines) + '\n```'
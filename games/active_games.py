@@ -0,0 +1,191 @@
+import asyncio
+import logging
+from os import getenv
+from typing import Union
+from dotenv import load_dotenv
+from sqlalchemy import Engine
+from sqlalchemy import bindparam
+from sqlalchemy import delete
+from sqlalchemy import event
+from sqlalchemy import select
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from games.blackjack import BlackJack
+from games.codec import decode_game_state
+from games.codec import encode_game_state
+from games.roulette import Roulette
+from models.model import Games
+from models.model import User
+from models.model import async_session
+
+logger = logging.getLogger(__name__)
+
+_GAMES_STAGED = 'active_games_staged'
+
+_UPDATE_GAME_STATE = update(Games.__table__) \
+    .where(Games.__table__.c.id == bindparam('game_id')) \
+    .values(game_state=bindparam('state'))
+
+
+class _ActiveGame:
+    __slots__ = ('game_id', 'game')
+
+    def __init__(self, game_id: int, game: Union[BlackJack | Roulette]):
+        self.game_id = game_id
+        self.game = game
+
+
+class ActiveGameRegistry:
+    """Every unfinished game, kept in memory and keyed by (guild_id, discord_id, game_type).
+
+    The registry is loaded from the games table when the bot starts and is the source of truth afterwards.
+    Commands get a private copy of a game and hand the changed copy back, so a command that fails half way never
+    leaves its changes in the registry:
+
+    - save() is for steps that move no money, the game is written to the table in the background in batches
+    - stage() and stage_removal() write the game inside the session that moves the money, and the registry only
+      takes the change once that session commits
+
+    A crash loses at most the steps saved during the last flush_interval seconds.
+    """
+
+    def __init__(self, flush_interval: float, batch_size: int):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._games: dict[tuple[int, int, str], _ActiveGame] = dict()
+        self._dirty: set[tuple[int, int, str]] = set()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Union[asyncio.Task | None] = None
+
+    def __len__(self) -> int:
+        return len(self._games)
+
+    @property
+    def pending_writes(self) -> int:
+        return len(self._dirty)
+
+    def load(self, engine: Engine):
+        """Rebuild the registry from the games table"""
+        with Session(engine) as session:
+            rows = session.execute(
+                select(Games.id, Games.game_type, Games.game_state, User.guild_id, User.discord_id)
+                .join(Games.user)).all()
+        self._games = {(row.guild_id, row.discord_id, row.game_type):
+                       _ActiveGame(row.id, decode_game_state(row.game_type, row.game_state)) for row in rows}
+        self._dirty.clear()
+        logger.info('Loaded %d active games', len(self._games))
+
+    def get(self, guild_id: int, discord_id: int, game_type: str) -> Union[BlackJack | Roulette | None]:
+        entry = self._games.get((guild_id, discord_id, game_type))
+        if entry is None:
+            return None
+        return decode_game_state(game_type, encode_game_state(entry.game))
+
+    def save(self, guild_id: int, discord_id: int, game: Union[BlackJack | Roulette]):
+        """Keep a step that moved no money, the games table is updated by the next background flush"""
+        key = (guild_id, discord_id, game.GAME_TYPE)
+        self._games[key].game = game
+        self._dirty.add(key)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def stage(self, session: AsyncSession, user: User, game: Union[BlackJack | Roulette]):
+        """Write the game in the session, the registry takes it once the session commits"""
+        key = (user.guild_id, user.discord_id, game.GAME_TYPE)
+        was_dirty = await self._take_pending_write(key)
+        entry = self._games.get(key)
+        if entry is None:
+            row = Games(user_id=user.id, game_type=game.GAME_TYPE, game_state=encode_game_state(game))
+            session.add(row)
+        else:
+            row = None
+            await session.execute(_UPDATE_GAME_STATE, {'game_id': entry.game_id, 'state': encode_game_state(game)})
+        session.sync_session.info.setdefault(_GAMES_STAGED, dict())[key] = (game, row, was_dirty)
+
+    async def stage_removal(self, session: AsyncSession, user: User, game_type: str):
+        """Delete the game in the session, the registry forgets it once the session commits"""
+        key = (user.guild_id, user.discord_id, game_type)
+        was_dirty = await self._take_pending_write(key)
+        entry = self._games.get(key)
+        if entry is not None:
+            await session.execute(delete(Games).where(Games.id == entry.game_id))
+        session.sync_session.info.setdefault(_GAMES_STAGED, dict())[key] = (None, None, was_dirty)
+
+    async def _take_pending_write(self, key: tuple[int, int, str]) -> bool:
+        # Waiting for a running flush keeps it from writing an older state after this session commits
+        async with self._flush_lock:
+            was_dirty = key in self._dirty
+            self._dirty.discard(key)
+        return was_dirty
+
+    def _apply_staged(self, session: Session):
+        for key, (game, row, _was_dirty) in session.info.pop(_GAMES_STAGED, dict()).items():
+            if game is None:
+                self._games.pop(key, None)
+            elif row is not None:
+                self._games[key] = _ActiveGame(row.id, game)
+            else:
+                self._games[key].game = game
+
+    def _discard_staged(self, session: Session):
+        for key, (_game, _row, was_dirty) in session.info.pop(_GAMES_STAGED, dict()).items():
+            if was_dirty:
+                self._dirty.add(key)
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        while self._dirty:
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception('Writing %d active games failed, retrying later', len(self._dirty))
+                await asyncio.sleep(self.flush_interval)
+
+    async def flush(self):
+        """Write up to batch_size saved games to the games table in one transaction"""
+        async with self._flush_lock:
+            keys = [key for key, _ in zip(self._dirty, range(self.batch_size))]
+            if not keys:
+                return
+            self._dirty.difference_update(keys)
+            states = self._pending_states(keys)
+            if not states:
+                return
+            try:
+                async with async_session() as session:
+                    await session.execute(_UPDATE_GAME_STATE, states)
+                    await session.commit()
+            except BaseException:
+                # Also when the flush is cancelled at shutdown, write_pending() has to find these games
+                self._dirty.update(keys)
+                raise
+
+    def write_pending(self, engine: Engine):
+        """Write every saved game synchronously, for shutting down after the event loop has stopped"""
+        states = self._pending_states(list(self._dirty))
+        if states:
+            with engine.begin() as connection:
+                connection.execute(_UPDATE_GAME_STATE, states)
+            logger.info('Wrote %d active games', len(states))
+        self._dirty.clear()
+
+    def _pending_states(self, keys: list[tuple[int, int, str]]) -> list[dict]:
+        # A game finished since it was saved is no longer in the registry, its row is already deleted
+        return [{'game_id': self._games[key].game_id, 'state': encode_game_state(self._games[key].game)}
+                for key in keys if key in self._games]
+
+
+load_dotenv()
+active_games = ActiveGameRegistry(float(getenv('CASINO_GAME_FLUSH_INTERVAL', 2)),
+                                  int(getenv('CASINO_GAME_FLUSH_BATCH', 500)))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_staged_games(session: Session):
+    active_games._apply_staged(session)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_staged_games(session: Session):
+    active_games._discard_staged(session)
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+from functools import cache
+from PIL import Image
+from PIL import ImageDraw
+from PIL import ImageFont
+from utils.bounded_cache import BoundedCache
+
+_IMAGES_DIRECTORY = os.path.join(os.path.dirname(__file__), 'images')
+_DEFAULT_CACHE_DIRECTORY = os.path.join(os.path.dirname(__file__), '.cache')
+CARDS_DIRECTORY = os.path.join(_IMAGES_DIRECTORY, 'cards')
+FONT_TTF_PATH = os.path.join(os.path.dirname(__file__), 'fonts', 'Smokum-Regular.ttf')
+
+CARD_BACK = 'back.png'
+CARD_RANKS = ('1', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'jack', 'queen', 'king')
+CARD_SUITS = ('clubs', 'diamonds', 'hearts', 'spades')
+CARD_NAMES = tuple(f'{rank}_{suit}.png' for suit in CARD_SUITS for rank in CARD_RANKS)
+
+
+def get_card_value(card_name: str) -> int:
+    rank, _ = card_name.split('_')
+    if rank.isdigit():
+        return int(rank)
+    return 10
+
+
+# Number of cards of each value from 1 (ace) to 10 in a full deck
+DECK_COUNTS = tuple(sum(get_card_value(card_name) == value for card_name in CARD_NAMES) for value in range(1, 11))
+
+
+def get_cache_directory() -> str:
+    return os.getenv('CASINO_CACHE_DIR', _DEFAULT_CACHE_DIRECTORY)
+
+
+def write_file_atomically(path: str, *chunks: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written next to the destination and swapped in, so a concurrent reader never opens a partial file
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as temporary_file:
+        for chunk in chunks:
+            temporary_file.write(chunk)
+    os.replace(temporary_path, path)
+
+
+class CardAtlas:
+    """Every card sprite decoded once into a single RGBA image.
+
+    The atlas is written to the cache directory as raw RGBA pixels behind a small JSON index, and read back
+    with mmap, so render processes share the decoded deck through the page cache instead of each holding a copy.
+    """
+    _MAGIC = b'ATL1'
+    _HEADER = struct.Struct('<4sI')
+    _COLUMNS = 11
+
+    def __init__(self, image: Image, boxes: dict[str, tuple[int, int, int, int]], mapping: mmap.mmap = None):
+        self._image = image
+        self._boxes = boxes
+        # Keeps the mapping open for as long as the atlas image points into it
+        self._mapping = mapping
+
+    def get(self, card_name: str) -> Image:
+        return self._image.crop(self._boxes[card_name])
+
+    @classmethod
+    def load(cls, cache_path: str) -> 'CardAtlas':
+        fingerprint = cls._fingerprint()
+        try:
+            return cls._map(cache_path, fingerprint)
+        except (OSError, ValueError):
+            pass
+
+        image, boxes = cls._build()
+        try:
+            cls._save(cache_path, fingerprint, image, boxes)
+            return cls._map(cache_path, fingerprint)
+        except (OSError, ValueError):
+            # A read only deployment still gets a decoded atlas, it just is not shared between processes
+            return cls(image, boxes)
+
+    @staticmethod
+    def _fingerprint() -> str:
+        digest = hashlib.sha256()
+        for card_name in CARD_NAMES + (CARD_BACK,):
+            stat = os.stat(os.path.join(CARDS_DIRECTORY, card_name))
+            digest.update(f'{card_name}:{stat.st_size}:{stat.st_mtime_ns};'.encode())
+        return digest.hexdigest()
+
+    @classmethod
+    def _build(cls) -> tuple[Image, dict[str, tuple[int, int, int, int]]]:
+        sprites = {}
+        for card_name in CARD_NAMES + (CARD_BACK,):
+            with Image.open(os.path.join(CARDS_DIRECTORY, card_name)) as sprite:
+                sprites[card_name] = sprite.convert('RGBA')
+        cell_width = max(sprite.width for sprite in sprites.values())
+        cell_height = max(sprite.height for sprite in sprites.values())
+        rows = -(-len(sprites) // cls._COLUMNS)
+
+        image = Image.new('RGBA', (cell_width * cls._COLUMNS, cell_height * rows))
+        boxes = {}
+        for index, (card_name, sprite) in enumerate(sprites.items()):
+            x = (index % cls._COLUMNS) * cell_width
+            y = (index // cls._COLUMNS) * cell_height
+            image.paste(sprite, (x, y))
+            boxes[card_name] = (x, y, x + sprite.width, y + sprite.height)
+        return image, boxes
+
+    @classmethod
+    def _save(cls, cache_path: str, fingerprint: str, image: Image, boxes: dict[str, tuple[int, int, int, int]]):
+        index = json.dumps({'fingerprint': fingerprint, 'size': image.size, 'boxes': boxes}).encode()
+        write_file_atomically(cache_path, cls._HEADER.pack(cls._MAGIC, len(index)), index, image.tobytes())
+
+    @classmethod
+    def _map(cls, cache_path: str, fingerprint: str) -> 'CardAtlas':
+        with open(cache_path, 'rb') as atlas_file:
+            mapping = mmap.mmap(atlas_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, index_length = cls._HEADER.unpack_from(mapping)
+            if magic != cls._MAGIC:
+                raise ValueError(f'Card atlas has an unknown format: {cache_path=}')
+            index = json.loads(mapping[cls._HEADER.size:cls._HEADER.size + index_length])
+            if index['fingerprint'] != fingerprint:
+                raise ValueError(f'Card atlas is older than the card images: {cache_path=}')
+
+            pixels_offset = cls._HEADER.size + index_length
+            width, height = index['size']
+            if len(mapping) - pixels_offset != width * height * 4:
+                raise ValueError(f'Card atlas is truncated: {cache_path=}')
+        except (struct.error, KeyError, ValueError) as error:
+            mapping.close()
+            raise ValueError(f'Card atlas can not be read: {cache_path=}') from error
+        image = Image.frombuffer('RGBA', (width, height), memoryview(mapping)[pixels_offset:], 'raw', 'RGBA', 0, 1)
+        boxes = {card_name: tuple(box) for card_name, box in index['boxes'].items()}
+        return CardAtlas(image, boxes, mapping)
+
+
+@cache
+def get_card_atlas() -> CardAtlas:
+    return CardAtlas.load(os.path.join(get_cache_directory(), 'cards.atlas'))
+
+
+def image_size_of(image: Image) -> int:
+    return image.width * image.height * len(image.getbands())
+
+
+@cache
+def get_image(image_path: str) -> Image:
+    """Decoded RGBA image, shared between callers so it must only be copied or pasted"""
+    with Image.open(image_path) as image:
+        return image.convert('RGBA')
+
+
+@cache
+def get_font(font_path: str, size: int) -> ImageFont.FreeTypeFont:
+    return ImageFont.truetype(font_path, size)
+
+
+# Headlines at size 200 are over a megabyte each, so the text layers are bounded by bytes rather than count
+_text_layers = BoundedCache(32 * 1024 * 1024, image_size_of)
+
+
+def get_text_layer(text: str, font_path: str, size: int, fill: str, padding: int = 0) -> Image:
+    """Transparent RGBA image with the text drawn on it, shared between callers so it must only be pasted"""
+    key = (text, font_path, size, fill, padding)
+    layer = _text_layers.get(key)
+    if layer is None:
+        font = get_font(font_path, size)
+        _, _, width, height = font.getbbox(text)
+        layer = Image.new('RGBA', (width + (2 * padding), height + (2 * padding)))
+        ImageDraw.Draw(layer).text((padding, padding), text, font=font, fill=fill)
+        _text_layers.put(key, layer)
+    return layer
@@ -1,18 +1,21 @@
-import os
 from random import shuffle
 from decimal import Decimal
 from PIL import Image
-from PIL import ImageDraw
-from PIL import ImageFont
 from io import BytesIO
-from utils.helpers import format_money
+from games.assets import CARD_BACK
+from games.assets import CARD_NAMES
+from games.assets import FONT_TTF_PATH
+from games.assets import get_card_atlas
+from games.assets import get_card_value
+from games.assets import get_text_layer
+from games.render_profiles import RenderProfile
+from games.render_profiles import get_render_profile
+from utils.formatting import format_money
 import json
 
 
 class BlackJack:
     GAME_TYPE = 'blackjack'
-    _CARDS_BASE_DIRECTORY = os.path.join(os.path.dirname(__file__), 'images', 'cards')
-    _FONT_TTF_PATH = os.path.join(os.path.dirname(__file__), 'fonts', 'Smokum-Regular.ttf')
 
     def __init__(self):
         self.state = {
@@ -26,15 +29,11 @@ class BlackJack:
         }
 
     def _load_playing_cards(self):
-        self.state['remaining_cards'] = os.listdir(BlackJack._CARDS_BASE_DIRECTORY)
-        self.state['remaining_cards'].remove('back.png')
+        self.state['remaining_cards'] = list(CARD_NAMES)
 
     @staticmethod
     def _get_card_value(card_name: str) -> int:
-        rank, _ = card_name.split('_')
-        if rank.isdigit():
-            return int(rank)
-        return 10
+        return get_card_value(card_name)
 
     def _shuffle_cards(self):
         shuffle(self.state['remaining_cards'])
@@ -141,13 +140,37 @@ class BlackJack:
     def from_json(cls, state: str):
         return BlackJack()._deserialize_from_json(state)
 
+    def snapshot(self) -> dict:
+        # Only the parts of the state the table image depends on, small enough to pickle into a render process
+        return {
+            'house_hand': list(self.state['house_hand']),
+            'player_hand': list(self.state['player_hand']),
+            'bet_amount': self.state['bet_amount'],
+            'game_ended': self.state['game_ended']
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot: dict):
+        game = BlackJack()
+        game.state.update(snapshot)
+        return game
+
+    def visual_state(self) -> tuple:
+        """Everything the table image shows, equal for two games exactly when their images are"""
+        return (self._get_headline_text(),
+                tuple(self._get_shown_cards(self.state['house_hand'], True)),
+                tuple(self._get_shown_cards(self.state['player_hand'], False)))
+
+    def _get_shown_cards(self, hand: list[str], hide_second_card: bool) -> list[str]:
+        if hide_second_card and not self.state['game_ended'] and len(hand) > 1:
+            return [hand[0], CARD_BACK] + hand[2:]
+        return list(hand)
+
     def _create_hand_image(self, hand: list[str], hide_second_card: bool = False) -> Image:
         spacing_between_cards = 20
-        card_images: list[Image] = []
-        for index, card_name in enumerate(hand):
-            if index == 1 and hide_second_card and not self.state['game_ended']:
-                card_name = 'back.png'
-            card_images.append(Image.open(os.path.join(BlackJack._CARDS_BASE_DIRECTORY, card_name)))
+        card_atlas = get_card_atlas()
+        card_images: list[Image] = [card_atlas.get(card_name)
+                                    for card_name in self._get_shown_cards(hand, hide_second_card)]
         card_width = card_images[0].width
         card_height = card_images[0].height
         canvas = Image.new('RGBA',
@@ -156,31 +179,28 @@ class BlackJack:
                             card_height))
         current_x = spacing_between_cards
         for image in card_images:
-            canvas.paste(image, (current_x, 0), mask=image.convert('RGBA'))
+            canvas.paste(image, (current_x, 0), mask=image)
             current_x += spacing_between_cards + card_width
         return canvas
 
-    def _create_headline_image(self) -> Image:
-        spacing = 10
+    def _get_headline_text(self) -> str:
         if self.state['game_ended']:
             winner = self._get_winner()
             if winner != 'push':
                 text = f'{winner} WON!'
             else:
                 text = winner
-            text = text.upper()
-        else:
-            text = f"AMOUNT BET: {format_money(self.state['bet_amount'])[0:-3]}"
+            return text.upper()
+        return f"AMOUNT BET: {format_money(self.state['bet_amount'])[0:-3]}"
 
-        font = ImageFont.truetype(BlackJack._FONT_TTF_PATH, 200)
-        _, _, w, h = font.getbbox(text)
-        canvas = Image.new('RGBA',
-                           (w + (2 * spacing), h + (2 * spacing)))
-        drawable_canvas = ImageDraw.Draw(canvas)
-        drawable_canvas.text((spacing, spacing), text, font=font, fill='gold')
-        return canvas
+    def _create_headline_image(self) -> Image:
+        spacing = 10
+        return get_text_layer(self._get_headline_text(), FONT_TTF_PATH, 200, 'gold', spacing)
 
-    def create_table_image(self) -> BytesIO:
+    def create_table_image(self, profile: RenderProfile = None) -> BytesIO:
+        return (profile or get_render_profile()).encode(self.compose_table_image())
+
+    def compose_table_image(self) -> Image:
         spacing_between_decks = 100
         width_min = 2500
         headline_image = self._create_headline_image()
@@ -199,8 +219,4 @@ class BlackJack:
             centered_x = (max_width - image_to_paste.width) // 2
             canvas.paste(image_to_paste, (centered_x, height_position), mask=image_to_paste)
             height_position += image_to_paste.height + spacing_between_decks
-
-        canvas_bytes = BytesIO()
-        canvas.save(canvas_bytes, 'PNG')
-        canvas_bytes.seek(0)
-        return canvas_bytes
+        return canvas
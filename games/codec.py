@@ -0,0 +1,164 @@
+from decimal import Decimal
+from typing import Union
+from games.assets import CARD_NAMES
+from games.blackjack import BlackJack
+from games.roulette import Roulette
+
+# Every state starts with a magic byte, the codec version and the game type, older states are JSON
+_MAGIC = 0xCA
+_VERSION = 1
+_GAME_TYPE_IDS = {
+    BlackJack.GAME_TYPE: 1,
+    Roulette.GAME_TYPE: 2
+}
+_CARD_INDEXES = {card_name: index for index, card_name in enumerate(CARD_NAMES)}
+# Part of the stored format, new bet types may only be appended
+_OUTSIDE_BET_ORDER = ('even', 'odd', 'first dozen', 'second dozen', 'third dozen', 'low', 'high')
+
+_BLACKJACK_GAME_ENDED = 0b01
+_BLACKJACK_CAN_DOUBLE_DOWN = 0b10
+
+
+def _write_varint(buffer: bytearray, value: int):
+    if value < 0:
+        raise ValueError(f'Value supplied for value can not be negative: {value=}')
+    while value >= 0x80:
+        buffer.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varint(data: bytes, offset: int) -> tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def _write_money(buffer: bytearray, amount: Decimal):
+    cents = int(amount * 100)
+    if cents != amount * 100:
+        raise ValueError(f'Value supplied for amount has fractional cents: {amount=}')
+    _write_varint(buffer, cents)
+
+
+def _read_money(data: bytes, offset: int) -> tuple[Decimal, int]:
+    cents, offset = _read_varint(data, offset)
+    return Decimal(cents).scaleb(-2), offset
+
+
+def _write_cards(buffer: bytearray, cards: list[str]):
+    buffer.append(len(cards))
+    buffer.extend(_CARD_INDEXES[card_name] for card_name in cards)
+
+
+def _read_cards(data: bytes, offset: int) -> tuple[list[str], int]:
+    card_count = data[offset]
+    offset += 1
+    return [CARD_NAMES[index] for index in data[offset:offset + card_count]], offset + card_count
+
+
+def _encode_blackjack(buffer: bytearray, game: BlackJack):
+    flags = 0
+    if game.state['game_ended']:
+        flags |= _BLACKJACK_GAME_ENDED
+    if game.state['can_double_down']:
+        flags |= _BLACKJACK_CAN_DOUBLE_DOWN
+    buffer.append(flags)
+    _write_money(buffer, game.state['bet_amount'])
+    _write_money(buffer, game.state['payout'])
+    _write_cards(buffer, game.state['remaining_cards'])
+    _write_cards(buffer, game.state['house_hand'])
+    _write_cards(buffer, game.state['player_hand'])
+
+
+def _decode_blackjack(data: bytes, offset: int) -> BlackJack:
+    game = BlackJack()
+    flags = data[offset]
+    game.state['game_ended'] = bool(flags & _BLACKJACK_GAME_ENDED)
+    game.state['can_double_down'] = bool(flags & _BLACKJACK_CAN_DOUBLE_DOWN)
+    game.state['bet_amount'], offset = _read_money(data, offset + 1)
+    game.state['payout'], offset = _read_money(data, offset)
+    game.state['remaining_cards'], offset = _read_cards(data, offset)
+    game.state['house_hand'], offset = _read_cards(data, offset)
+    game.state['player_hand'], offset = _read_cards(data, offset)
+    return game
+
+
+def _encode_roulette(buffer: bytearray, game: Roulette):
+    buffer.append(int(game.bet_placed))
+    _write_money(buffer, game.bet_total)
+    _write_money(buffer, game.payout)
+
+    outside_bets = [(index, game.outside_bets[bet_type]['amount'])
+                    for index, bet_type in enumerate(_OUTSIDE_BET_ORDER)
+                    if game.outside_bets[bet_type]['amount'] != Decimal('0.00')]
+    buffer.append(len(outside_bets))
+    for index, amount in outside_bets:
+        buffer.append(index)
+        _write_money(buffer, amount)
+
+    inside_bets = game.inside_bets['straight up']['picks']
+    buffer.append(len(inside_bets))
+    for table_tile, pick in inside_bets.items():
+        buffer.append(int(table_tile))
+        _write_money(buffer, pick['amount'])
+
+
+def _decode_roulette(data: bytes, offset: int) -> Roulette:
+    game = Roulette()
+    game.bet_placed = bool(data[offset])
+    game.bet_total, offset = _read_money(data, offset + 1)
+    game.payout, offset = _read_money(data, offset)
+
+    outside_count = data[offset]
+    offset += 1
+    for _ in range(outside_count):
+        bet_type = _OUTSIDE_BET_ORDER[data[offset]]
+        game.outside_bets[bet_type]['amount'], offset = _read_money(data, offset + 1)
+
+    inside_count = data[offset]
+    offset += 1
+    for _ in range(inside_count):
+        table_tile = str(data[offset])
+        amount, offset = _read_money(data, offset + 1)
+        game.inside_bets['straight up']['picks'][table_tile] = {'amount': amount}
+    return game
+
+
+_ENCODERS = {
+    BlackJack.GAME_TYPE: _encode_blackjack,
+    Roulette.GAME_TYPE: _encode_roulette
+}
+_DECODERS = {
+    _GAME_TYPE_IDS[BlackJack.GAME_TYPE]: _decode_blackjack,
+    _GAME_TYPE_IDS[Roulette.GAME_TYPE]: _decode_roulette
+}
+_JSON_DECODERS = {
+    BlackJack.GAME_TYPE: BlackJack.from_json,
+    Roulette.GAME_TYPE: Roulette.from_json
+}
+
+
+def encode_game_state(game: Union[BlackJack | Roulette]) -> bytes:
+    buffer = bytearray((_MAGIC, _VERSION, _GAME_TYPE_IDS[game.GAME_TYPE]))
+    _ENCODERS[game.GAME_TYPE](buffer, game)
+    return bytes(buffer)
+
+
+def decode_game_state(game_type: str, data: Union[bytes | str]) -> Union[BlackJack | Roulette]:
+    """Decode a state written by encode_game_state, or by serialize_to_json before the binary codec existed"""
+    if isinstance(data, str) or data[0:1] == b'{':
+        return _JSON_DECODERS[game_type](data)
+    if data[0] != _MAGIC:
+        raise ValueError(f'Value supplied for data is not an encoded game state: {data[0:3]=}')
+    if data[1] != _VERSION:
+        raise ValueError(f'Game state was encoded by an unknown codec version: {data[1]=}')
+    if data[2] != _GAME_TYPE_IDS[game_type]:
+        raise ValueError(f'Game state does not belong to a {game_type} game: {data[2]=}')
+    return _DECODERS[data[2]](data, 3)
@@ -0,0 +1,109 @@
+from io import BytesIO
+from locale import LC_ALL
+from locale import setlocale
+from os import getenv
+from time import perf_counter
+from typing import NamedTuple
+from dotenv import load_dotenv
+from PIL import Image
+
+
+class RenderProfile(NamedTuple):
+    """How a finished table image is shrunk and encoded before it is uploaded to Discord"""
+    name: str
+    image_format: str
+    # Integer factor the image is reduced by before encoding, 1 keeps the full size
+    downscale: int = 1
+    # Number of palette colors for a quantized PNG, 0 keeps full RGBA
+    palette_colors: int = 0
+    # zlib level for PNG, ignored by the lossy formats
+    compress_level: int = 6
+    # Quality for WEBP and JPEG, ignored by PNG
+    quality: int = 80
+
+    @property
+    def extension(self) -> str:
+        return self.image_format.lower()
+
+    def encode(self, image: Image) -> BytesIO:
+        if self.downscale > 1:
+            image = image.reduce(self.downscale)
+
+        image_bytes = BytesIO()
+        if self.image_format == 'PNG':
+            if self.palette_colors:
+                image = image.quantize(colors=self.palette_colors, method=Image.Quantize.FASTOCTREE)
+            image.save(image_bytes, 'PNG', compress_level=self.compress_level)
+        elif self.image_format == 'WEBP':
+            image.save(image_bytes, 'WEBP', quality=self.quality, method=4)
+        elif self.image_format == 'JPEG':
+            # Both tables are fully opaque, so dropping the alpha channel does not change what is shown
+            image.convert('RGB').save(image_bytes, 'JPEG', quality=self.quality)
+        else:
+            raise ValueError(f'Value supplied for image_format is not valid: {self.image_format=}')
+        image_bytes.seek(0)
+        return image_bytes
+
+
+RENDER_PROFILES = {
+    profile.name: profile for profile in (
+        RenderProfile('lossless', 'PNG'),
+        RenderProfile('fast', 'PNG', compress_level=1),
+        RenderProfile('palette', 'PNG', palette_colors=256, compress_level=6),
+        RenderProfile('compact', 'PNG', downscale=2, palette_colors=256, compress_level=9),
+        RenderProfile('webp', 'WEBP', downscale=2, quality=80),
+        RenderProfile('jpeg', 'JPEG', downscale=2, quality=85),
+    )
+}
+
+
+def get_render_profile(name: str = None) -> RenderProfile:
+    name = name or getenv('CASINO_RENDER_PROFILE', 'lossless')
+    if name not in RENDER_PROFILES:
+        raise ValueError(f'Value supplied for the render profile is not valid: {name=}')
+    return RENDER_PROFILES[name]
+
+
+def profile_report(images: dict[str, Image], repeat: int = 5) -> list[dict]:
+    """Encode every image with every profile, reporting the average upload size and encode time"""
+    report = []
+    for profile in RENDER_PROFILES.values():
+        for image_name, image in images.items():
+            start = perf_counter()
+            for _ in range(repeat):
+                encoded_size = len(profile.encode(image).getbuffer())
+            report.append({
+                'profile': profile.name,
+                'image': image_name,
+                'bytes': encoded_size,
+                'milliseconds': (perf_counter() - start) * 1000 / repeat
+            })
+    return report
+
+
+def sample_games() -> dict:
+    """A running blackjack game and a roulette table with several bets, shared by the benchmarks"""
+    # Imported here, both games import this module
+    from decimal import Decimal
+    from games.blackjack import BlackJack
+    from games.roulette import Roulette
+
+    blackjack_game = BlackJack()
+    blackjack_game.start_game(Decimal('1000'))
+    roulette_game = Roulette()
+    for table_tile in ('0', '7', '17', '32'):
+        roulette_game.add_inside_bet(table_tile, Decimal('250'))
+    roulette_game.add_outside_bet('odd', Decimal('5000'))
+    return {
+        'blackjack': blackjack_game,
+        'roulette': roulette_game
+    }
+
+
+if __name__ == '__main__':
+    # The sample tables show money, which is formatted with the configured locale
+    load_dotenv()
+    setlocale(LC_ALL, getenv('CASINO_LOCALE', 'en_US.UTF-8'))
+    print(f'{"profile":<10}{"image":<12}{"bytes":>12}{"ms":>10}')
+    for row in profile_report({name: game.compose_table_image() for name, game in sample_games().items()}):
+        print(f'{row["profile"]:<10}{row["image"]:<12}{row["bytes"]:>12,}{row["milliseconds"]:>10.1f}')
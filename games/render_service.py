@@ -0,0 +1,190 @@
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import Executor
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait
+from contextvars import Context
+from contextvars import copy_context
+from hashlib import sha256
+from io import BytesIO
+from os import cpu_count
+from os import getenv
+from time import perf_counter
+from typing import Hashable
+from typing import Union
+from dotenv import load_dotenv
+from games.assets import get_card_atlas
+from games.blackjack import BlackJack
+from games.roulette import Roulette
+from games.render_profiles import RenderProfile
+from games.render_profiles import get_render_profile
+from utils.bounded_cache import BoundedCache
+from utils.metrics import image_cache_bytes
+from utils.metrics import image_cache_hit_rate
+from utils.metrics import record_cached_image
+from utils.metrics import record_render
+from utils.metrics import record_superseded_render
+from utils.metrics import render_queue_depth
+
+_GAME_CLASSES = {
+    BlackJack.GAME_TYPE: BlackJack,
+    Roulette.GAME_TYPE: Roulette
+}
+
+
+def _render_snapshot(game_type: str, snapshot: dict, profile: RenderProfile) -> bytes:
+    # Runs inside a worker process, so it only receives and returns picklable values
+    return _GAME_CLASSES[game_type].from_snapshot(snapshot).create_table_image(profile).getvalue()
+
+
+def _warm_up():
+    pass
+
+
+def get_image_key(game: Union[BlackJack | Roulette], profile: RenderProfile) -> bytes:
+    """Hash of what the table image of game shows and how it is encoded, equal exactly when the images are"""
+    return sha256(repr((game.GAME_TYPE, game.visual_state(), tuple(profile))).encode()).digest()
+
+
+class _RenderRequest:
+    def __init__(self, game: Union[BlackJack | Roulette], image_key: bytes):
+        self.game_type = game.GAME_TYPE
+        self.image_key = image_key
+        # Taken right away, the game keeps changing while the request waits in the queue
+        self.snapshot = game.snapshot()
+        # The table of a finished game shows its result, a newer game of the user must not replace it
+        self.final = self.snapshot.get('game_ended', False)
+        # The render is recorded for the command that asked for it, not for the task rendering it
+        self.context: Context = copy_context()
+        self.image: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class RenderService:
+    """Renders table images outside the event loop.
+
+    Games are shipped to a process pool as a snapshot of their visual state and come back as PNG bytes,
+    so PIL compositing and encoding run on other cores instead of holding the GIL of the bot process.
+    A worker count of 0 renders in the default thread pool instead, which is handy for development.
+    """
+
+    def __init__(self, max_workers: int, profile: RenderProfile, max_queued: int, max_cached_bytes: int):
+        self.max_workers = max_workers
+        self.profile = profile
+        self.max_queued = max_queued
+        # Encoded images by get_image_key(), a table rendered before is served without queueing it
+        self.images = BoundedCache(max_cached_bytes, len)
+        self._executor: Union[Executor | None] = None
+        # Waiting requests with one consumer per worker, keyed by (guild_id, discord_id, game_type) or by the request
+        self._queued: OrderedDict[Hashable, _RenderRequest] = OrderedDict()
+        self._queue_changed: Union[asyncio.Condition | None] = None
+        self._consumers: list[asyncio.Task] = []
+        self._loop: Union[asyncio.AbstractEventLoop | None] = None
+
+    def start(self):
+        """Fork the worker processes, ideally before the bot connects and starts any threads"""
+        if self._executor is not None or self.max_workers == 0:
+            return
+        # Mapped before forking so every worker inherits the atlas instead of opening it again
+        get_card_atlas()
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        wait([self._executor.submit(_warm_up) for _ in range(self.max_workers)])
+
+    def shutdown(self):
+        for consumer in self._consumers:
+            consumer.cancel()
+        self._consumers = []
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queued)
+
+    def image_cache_stats(self) -> dict:
+        return {
+            'entries': len(self.images),
+            'bytes': self.images.size,
+            'hit_rate': self.images.hit_rate
+        }
+
+    def _start_consumers(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        # Also restarted for a new event loop, the old consumers and condition belong to the closed one
+        self._loop = loop
+        self._queued.clear()
+        self._queue_changed = asyncio.Condition()
+        self._consumers = [loop.create_task(self._consume()) for _ in range(self.max_workers or 1)]
+
+    async def submit(self, game: Union[BlackJack | Roulette], guild_id: int = None, discord_id: int = None,
+                     wait: bool = True) -> Union[asyncio.Future | None]:
+        """Queue the table of game, the image resolves to None if a newer table of its owner replaces it
+
+        Without wait a full queue returns None right away instead of waiting for a free place.
+        """
+        self._start_consumers()
+        request = _RenderRequest(game, get_image_key(game, self.profile))
+        key = (guild_id, discord_id, request.game_type) if discord_id is not None and not request.final else request
+        image_bytes: Union[bytes | None] = self.images.get(request.image_key)
+        image_cache_hit_rate.set(self.images.hit_rate)
+        if image_bytes is not None:
+            record_cached_image(len(image_bytes))
+            # Served right away, an older table of the same game still waiting would be uploaded after this one
+            async with self._queue_changed:
+                self._supersede(self._queued.pop(key, None))
+                render_queue_depth.set(len(self._queued))
+                self._queue_changed.notify_all()
+            request.image.set_result(BytesIO(image_bytes))
+            return request.image
+
+        self.start()
+        async with self._queue_changed:
+            if key not in self._queued:
+                if not wait and len(self._queued) >= self.max_queued:
+                    return None
+                await self._queue_changed.wait_for(lambda: len(self._queued) < self.max_queued or key in self._queued)
+            self._supersede(self._queued.get(key))
+            # Replacing a waiting request keeps its place in the queue
+            self._queued[key] = request
+            render_queue_depth.set(len(self._queued))
+            self._queue_changed.notify_all()
+        return request.image
+
+    @staticmethod
+    def _supersede(request: Union[_RenderRequest | None]):
+        if request is not None and not request.image.done():
+            request.context.run(record_superseded_render)
+            request.image.set_result(None)
+
+    async def _consume(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            async with self._queue_changed:
+                await self._queue_changed.wait_for(lambda: self._queued)
+                _, request = self._queued.popitem(last=False)
+                render_queue_depth.set(len(self._queued))
+                self._queue_changed.notify_all()
+            # Cancelled by a command that no longer needs the table
+            if request.image.done():
+                continue
+            start = perf_counter()
+            try:
+                image_bytes: bytes = await loop.run_in_executor(self._executor, _render_snapshot,
+                                                                request.game_type, request.snapshot, self.profile)
+            except Exception as error:
+                if not request.image.done():
+                    request.image.set_exception(error)
+                continue
+            self.images.put(request.image_key, image_bytes)
+            image_cache_bytes.set(self.images.size)
+            request.context.run(record_render, perf_counter() - start, len(image_bytes))
+            if not request.image.done():
+                request.image.set_result(BytesIO(image_bytes))
+
+
+load_dotenv()
+render_service = RenderService(int(getenv('CASINO_RENDER_WORKERS', cpu_count() or 1)), get_render_profile(),
+                               int(getenv('CASINO_RENDER_QUEUE_SIZE', 32)),
+                               int(getenv('CASINO_IMAGE_CACHE_MB', 64)) * 1024 * 1024)
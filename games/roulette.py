@@ -1,10 +1,27 @@
 from decimal import Decimal
-from random import choice
+from functools import cache
+from random import randrange
 from os import path
-from PIL import Image, ImageFont, ImageDraw
+from PIL import Image
 from io import BytesIO
+from typing import Union
 import json
-from utils.helpers import format_money
+from games.assets import FONT_TTF_PATH
+from games.assets import get_image
+from games.assets import get_text_layer
+from games.assets import image_size_of
+from games.render_profiles import RenderProfile
+from games.render_profiles import get_render_profile
+from utils.bounded_cache import BoundedCache
+from utils.formatting import format_money
+
+
+def _build_payout_matrix(outside_bet_tiles: dict[str, range], tile_count: int) -> tuple[tuple[int, ...], ...]:
+    # A bet covering n of the 36 numbered tiles returns 36 / n: 2 for even money, 3 for a dozen and 36 straight up
+    return tuple(
+        tuple(36 // len(tiles) if tile in tiles else 0 for tiles in outside_bet_tiles.values()) +
+        tuple(36 if tile == straight_up_tile else 0 for straight_up_tile in range(tile_count))
+        for tile in range(tile_count))
 
 
 class Roulette:
@@ -16,6 +33,24 @@ class Roulette:
 
     GAME_TYPE = 'roulette'
 
+    # Tiles won by each outside bet, zero loses every outside bet
+    _OUTSIDE_BET_TILES = {
+        'even': range(2, 37, 2),
+        'odd': range(1, 37, 2),
+        'first dozen': range(1, 13),
+        'second dozen': range(13, 25),
+        'third dozen': range(25, 37),
+        'low': range(1, 19),
+        'high': range(19, 37)
+    }
+
+    # Outside bets followed by one straight up bet per tile
+    BET_TYPES = OUTSIDE_BETS + TABLE_NUMBERS
+    _BET_INDEXES = {bet_type: index for index, bet_type in enumerate(BET_TYPES)}
+
+    # PAYOUT_MATRIX[tile][bet type] is what a bet of 1 returns, stake included, when the ball lands on that tile
+    PAYOUT_MATRIX = _build_payout_matrix(_OUTSIDE_BET_TILES, len(TABLE_NUMBERS))
+
     _OUTSIDE_IMAGE_POSITIONS = {
         'even': (336, 410),
         'odd': (820, 410),
@@ -35,19 +70,8 @@ class Roulette:
 
     _CHIP_PATH = path.join(path.dirname(__file__), 'images', 'chip.png')
     _TABLE_PATH = path.join(path.dirname(__file__), 'images', 'roulette', 'roulette_table.png')
-    _FONT_TTF_PATH = path.join(path.dirname(__file__), 'fonts', 'Smokum-Regular.ttf')
 
     def __init__(self):
-        self.outside_mappings = {
-            'even': self._is_even,
-            'odd': self._is_odd,
-            'first dozen': self._is_first_dozen,
-            'second dozen': self._is_second_dozen,
-            'third dozen': self._is_third_dozen,
-            'low': self._is_low,
-            'high': self._is_high,
-        }
-
         self.outside_bets = {
             'even':
                 {'amount': Decimal('0.00'),
@@ -133,124 +157,105 @@ class Roulette:
     def from_json(cls, state: str):
         return Roulette()._deserialize_from_json(state)
 
+    def snapshot(self) -> dict:
+        # Only the bet amounts the table image depends on, small enough to pickle into a render process
+        return {
+            'outside_bets': {bet_type: bet['amount'] for bet_type, bet in self.outside_bets.items()},
+            'inside_bets': {tile: pick['amount'] for tile, pick in self.inside_bets['straight up']['picks'].items()}
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot: dict):
+        game = Roulette()
+        for bet_type, amount in snapshot['outside_bets'].items():
+            game.outside_bets[bet_type]['amount'] = amount
+        for tile, amount in snapshot['inside_bets'].items():
+            game.inside_bets['straight up']['picks'][tile] = {'amount': amount}
+        return game
+
     def play(self):
         if not self.bet_placed:
             raise RuntimeError('No bets have been placed')
 
-        self.tile_picked = choice(Roulette.TABLE_NUMBERS)
-        for outer_group in self.outside_bets:
-            if self.outside_mappings[outer_group](self.tile_picked) and \
-                    self.outside_bets[outer_group]['amount'] > Decimal('0.00'):
-                bet_payout = self.outside_bets[outer_group]['amount'] * \
-                             (Decimal('1.00') + self.outside_bets[outer_group]['payout'])
+        spin = randrange(len(Roulette.TABLE_NUMBERS))
+        self.tile_picked = Roulette.TABLE_NUMBERS[spin]
+        spin_returns = Roulette.PAYOUT_MATRIX[spin]
+        for bet_type, amount in self._get_placed_bets():
+            bet_return = spin_returns[Roulette._BET_INDEXES[bet_type]]
+            if bet_return:
+                bet_payout = amount * bet_return
                 self.payout += bet_payout
-                self.bet_hits.append([outer_group, bet_payout])
-
-        if self.tile_picked in self.inside_bets['straight up']['picks']:
-            bet_payout = self.inside_bets['straight up']['picks'][self.tile_picked]['amount'] * \
-                         (Decimal('1.00') + self.inside_bets['straight up']['payout'])
-            self.payout += bet_payout
-            self.bet_hits.append([self.tile_picked, bet_payout])
+                self.bet_hits.append([bet_type, bet_payout])
+
+    def _get_placed_bets(self) -> list[tuple[str, Decimal]]:
+        placed_bets = [(bet_type, bet['amount']) for bet_type, bet in self.outside_bets.items()
+                       if bet['amount'] > Decimal('0.00')]
+        placed_bets.extend((table_tile, pick['amount'])
+                           for table_tile, pick in self.inside_bets['straight up']['picks'].items())
+        return placed_bets
+
+    def get_bet_amounts(self) -> list[Decimal]:
+        """The amount placed on every bet type, in the column order of PAYOUT_MATRIX"""
+        bet_amounts = [Decimal('0.00')] * len(Roulette.BET_TYPES)
+        for bet_type, amount in self._get_placed_bets():
+            bet_amounts[Roulette._BET_INDEXES[bet_type]] += amount
+        return bet_amounts
 
     @staticmethod
-    def _is_even(tile: str) -> bool:
-        if tile == '0':
-            return False
-        if int(tile) % 2 == 0:
-            return True
-        return False
+    def settle(spins, bets):
+        """Total payout of many spins at once.
 
-    @staticmethod
-    def _is_odd(tile: str) -> bool:
-        if tile == '0':
-            return False
-        if int(tile) % 2 == 1:
-            return True
-        return False
+        spins holds indexes into TABLE_NUMBERS, shaped (n,). bets holds the amount on every bet type in the column
+        order of PAYOUT_MATRIX, shaped (n, 44) for a different table per spin or (44,) for the same bets on every
+        spin. Returns a NumPy array of n payouts that include the winning stakes, like Roulette.payout.
+        """
+        import numpy as np
 
-    @staticmethod
-    def _is_first_dozen(tile: str) -> bool:
-        if tile == '0':
-            return False
-        num = int(tile)
-        if 1 <= num <= 12:
-            return True
-        return False
-
-    @staticmethod
-    def _is_second_dozen(tile: str) -> bool:
-        if tile == '0':
-            return False
-        num = int(tile)
-        if 13 <= num <= 24:
-            return True
-        return False
-
-    @staticmethod
-    def _is_third_dozen(tile: str) -> bool:
-        if tile == '0':
-            return False
-        num = int(tile)
-        if 25 <= num <= 36:
-            return True
-        return False
+        return (np.asarray(bets) * Roulette._get_payout_array()[np.asarray(spins)]).sum(axis=-1)
 
     @staticmethod
-    def _is_low(tile: str) -> bool:
-        if tile == '0':
-            return False
-        num = int(tile)
-        if 1 <= num <= 18:
-            return True
-        return False
+    @cache
+    def _get_payout_array():
+        import numpy as np
 
-    @staticmethod
-    def _is_high(tile: str) -> bool:
-        if tile == '0':
-            return False
-        num = int(tile)
-        if 19 <= num <= 36:
-            return True
-        return False
+        return np.array(Roulette.PAYOUT_MATRIX, dtype=np.int64)
 
     @staticmethod
-    def _create_chip(value: Decimal) -> Image:
-        chip_image: Image = Image.open(Roulette._CHIP_PATH)
+    def _create_chip(text: str) -> Image:
+        chip_image: Image = get_image(Roulette._CHIP_PATH).copy()
         chip_width = chip_image.width
         chip_height = chip_image.height
 
-        drawable_chip: ImageDraw = ImageDraw.Draw(chip_image)
-        font = ImageFont.truetype(Roulette._FONT_TTF_PATH, 20)
-        text = format_money(value)[0:-3]
-        _, _, w, h = drawable_chip.textbbox((0, 0), text, font=font)
-
-        centered_x_axis = (chip_width - w) / 2
-        centered_y_axis = (chip_height - h) / 2
-        drawable_chip.text((centered_x_axis, centered_y_axis), text, font=font, fill='black')
+        text_image = get_text_layer(text, FONT_TTF_PATH, 20, 'black')
+        centered_x_axis = (chip_width - text_image.width) // 2
+        centered_y_axis = (chip_height - text_image.height) // 2
+        chip_image.paste(text_image, (centered_x_axis, centered_y_axis), mask=text_image)
         return chip_image
 
-    def create_table_image(self) -> BytesIO:
-        roulette_table = Image.open(Roulette._TABLE_PATH)
+    def _get_chip_labels(self) -> dict[str, str]:
+        chip_labels = dict()
         for outer_bet in self.outside_bets:
             if self.outside_bets[outer_bet]['amount'] != Decimal('0.00'):
-                bet_value = self.outside_bets[outer_bet]['amount']
-                chip_image = self._create_chip(bet_value)
-                chip_x = self._OUTSIDE_IMAGE_POSITIONS[outer_bet][0] - int(chip_image.width / 2)
-                chip_y = self._OUTSIDE_IMAGE_POSITIONS[outer_bet][1] - int(chip_image.height / 2)
-                roulette_table.paste(chip_image, (chip_x, chip_y), mask=chip_image.convert('RGBA'))
-
+                chip_labels[outer_bet] = format_money(self.outside_bets[outer_bet]['amount'])[0:-3]
         for inside_bet in self.inside_bets['straight up']['picks']:
-            bet_value = self.inside_bets['straight up']['picks'][inside_bet]['amount']
-            chip_image = self._create_chip(bet_value)
-            start_x, start_y = self._calculate_inside_bet_position(inside_bet)
-            chip_x = start_x - (chip_image.width // 2)
-            chip_y = start_y - (chip_image.height // 2)
-            roulette_table.paste(chip_image, (chip_x, chip_y), mask=chip_image.convert('RGBA'))
-
-        roulette_table_bytes = BytesIO()
-        roulette_table.save(roulette_table_bytes, 'PNG')
-        roulette_table_bytes.seek(0)
-        return roulette_table_bytes
+            chip_labels[inside_bet] = format_money(self.inside_bets['straight up']['picks'][inside_bet]['amount'])[0:-3]
+        return chip_labels
+
+    def visual_state(self) -> tuple:
+        """Everything the table image shows, equal for two games exactly when their images are"""
+        return tuple(sorted(self._get_chip_labels().items()))
+
+    def create_table_image(self, profile: RenderProfile = None) -> BytesIO:
+        return (profile or get_render_profile()).encode(self.compose_table_image())
+
+    def compose_table_image(self) -> Image:
+        return _table_renderer.render(self._get_chip_labels())
+
+    @staticmethod
+    def _get_chip_position(bet: str) -> tuple[int, int]:
+        if bet in Roulette._OUTSIDE_IMAGE_POSITIONS:
+            return Roulette._OUTSIDE_IMAGE_POSITIONS[bet]
+        return Roulette._calculate_inside_bet_position(bet)
 
     @staticmethod
     def _calculate_inside_bet_position(inside_bet: str):
@@ -263,3 +268,92 @@ class Roulette:
         x_pos = starting_x + (((number_bet - 1) // 3) * Roulette._INSIDE_IMAGE_POSITIONS['x_distance'])
         y_pos = starting_y - (((number_bet - 1) % 3) * Roulette._INSIDE_IMAGE_POSITIONS['y_distance'])
         return x_pos, y_pos
+
+
+class _LayeredTableRenderer:
+    """Composes roulette table images out of cached layers.
+
+    The decoded table is the bottom layer and chip sprites are cached by their label. Finished tables are kept
+    by chip layout, and a new layout starts from the cached table closest to it, so placing one more bet only
+    repaints the chip that changed instead of every chip on the table.
+    """
+
+    def __init__(self):
+        self._chips = BoundedCache(256)
+        self._tables = BoundedCache(32 * 1024 * 1024, image_size_of)
+
+    def render(self, chip_labels: dict[str, str]) -> Image:
+        """Table with a chip for each bet, shared between callers so it must not be drawn on"""
+        layout = tuple(sorted(chip_labels.items()))
+        table = self._tables.get(layout)
+        if table is None:
+            table = self._compose(chip_labels)
+            self._tables.put(layout, table)
+        return table
+
+    def clear(self):
+        """Forget the finished tables, the chip sprites stay cached"""
+        self._tables.clear()
+
+    def _compose(self, chip_labels: dict[str, str]) -> Image:
+        base_table = get_image(Roulette._TABLE_PATH)
+        closest_table, changed_bets = self._find_closest_table(chip_labels)
+        if closest_table is None:
+            table = base_table.copy()
+            changed_bets = list(chip_labels)
+        else:
+            table = closest_table.copy()
+
+        for bet in changed_bets:
+            chip_box = self._get_chip_box(bet)
+            # Clear the old chip first, its transparent edge would otherwise show around the new one
+            table.paste(base_table.crop(chip_box), chip_box)
+            if bet in chip_labels:
+                chip_image = self._get_chip(chip_labels[bet])
+                table.paste(chip_image, chip_box[0:2], mask=chip_image)
+        return table
+
+    def _find_closest_table(self, chip_labels: dict[str, str]) -> tuple[Union[Image.Image | None], list[str]]:
+        closest_table = None
+        closest_changes = list(chip_labels)
+        for layout in self._tables.keys():
+            cached_labels = dict(layout)
+            changed_bets = [bet for bet in chip_labels.keys() | cached_labels.keys()
+                            if chip_labels.get(bet) != cached_labels.get(bet)]
+            # Starting from the plain table paints every chip once, a cached table has to beat that
+            if len(changed_bets) >= len(closest_changes):
+                continue
+            # A chip can only be repainted on its own if clearing it does not wipe part of a neighbouring chip
+            other_bets = (chip_labels.keys() | cached_labels.keys()).difference(changed_bets)
+            if any(self._chips_overlap(changed_bet, other_bet)
+                   for changed_bet in changed_bets for other_bet in other_bets):
+                continue
+            table = self._tables.get(layout)
+            if table is not None:
+                closest_table = table
+                closest_changes = changed_bets
+        return closest_table, closest_changes
+
+    def _get_chip(self, label: str) -> Image:
+        chip_image = self._chips.get(label)
+        if chip_image is None:
+            chip_image = Roulette._create_chip(label)
+            self._chips.put(label, chip_image)
+        return chip_image
+
+    @staticmethod
+    def _get_chip_box(bet: str) -> tuple[int, int, int, int]:
+        chip_base = get_image(Roulette._CHIP_PATH)
+        center_x, center_y = Roulette._get_chip_position(bet)
+        chip_x = center_x - (chip_base.width // 2)
+        chip_y = center_y - (chip_base.height // 2)
+        return chip_x, chip_y, chip_x + chip_base.width, chip_y + chip_base.height
+
+    def _chips_overlap(self, first_bet: str, second_bet: str) -> bool:
+        first_box = self._get_chip_box(first_bet)
+        second_box = self._get_chip_box(second_bet)
+        return first_box[0] < second_box[2] and second_box[0] < first_box[2] and \
+            first_box[1] < second_box[3] and second_box[1] < first_box[3]
+
+
+_table_renderer = _LayeredTableRenderer()
@@ -0,0 +1,156 @@
+import numpy as np
+from argparse import ArgumentParser
+from time import perf_counter
+from typing import NamedTuple
+from typing import Union
+from games.assets import DECK_COUNTS
+
+
+class Policy(NamedTuple):
+    """How a simulated player plays their hand"""
+    name: str
+    # The player hits while a hand without a usable ace is worth less than this
+    hard_stand: int
+    # The player hits while a hand counting an ace as 11 is worth less than this
+    soft_stand: int
+    # Hand values the player doubles down on, before taking any card
+    double_down_on: tuple[int, ...] = ()
+
+
+POLICIES = {
+    policy.name: policy for policy in (
+        Policy('never-hit', 0, 0),
+        Policy('stand-12', 12, 12),
+        Policy('stand-15', 15, 15),
+        Policy('mimic-house', 17, 17),
+        Policy('stand-17-soft-18', 17, 18),
+        Policy('double-10-11', 17, 18, (10, 11)),
+        Policy('stand-19', 19, 19),
+    )
+}
+
+
+class SimulationResult(NamedTuple):
+    policy: str
+    hands: int
+    # Average amount won or lost per unit of the starting bet, negative values are the house edge
+    expected_return: float
+    standard_error: float
+    win_rate: float
+    push_rate: float
+    blackjack_rate: float
+    seconds: float
+
+
+class _Hands:
+    def __init__(self, size: int):
+        self.hard_value = np.zeros(size, np.int16)
+        self.has_ace = np.zeros(size, np.bool_)
+        self.card_count = np.zeros(size, np.int8)
+
+    def add(self, rows: np.ndarray, card_values: np.ndarray):
+        self.hard_value[rows] += card_values
+        self.has_ace[rows] |= card_values == 1
+        self.card_count[rows] += 1
+
+    def values(self, rows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # Same as BlackJack._calculate_hand_value, one ace counts as 11 when that does not bust the hand
+        hard_value = self.hard_value[rows]
+        soft = self.has_ace[rows] & (hard_value + 10 <= 21)
+        return np.where(soft, hard_value + 10, hard_value), soft
+
+
+class _Shoe:
+    """An independent deck for every hand of a batch"""
+
+    def __init__(self, size: int, rng: np.random.Generator):
+        self.rng = rng
+        self.counts = np.tile(np.array(DECK_COUNTS, np.int8), (size, 1))
+        self.remaining = np.full(size, sum(DECK_COUNTS), np.int8)
+
+    def draw(self, rows: np.ndarray) -> np.ndarray:
+        picks = self.rng.integers(0, self.remaining[rows])
+        card_indexes = (self.counts[rows].cumsum(axis=1, dtype=np.int8) <= picks[:, None]).sum(axis=1)
+        self.counts[rows, card_indexes] -= 1
+        self.remaining[rows] -= 1
+        return card_indexes + 1
+
+
+def play_hands(policy: Policy, size: int, rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    """Play size hands, returning the net result per unit of the starting bet and whether it was a winning blackjack"""
+    shoe = _Shoe(size, rng)
+    house, player = _Hands(size), _Hands(size)
+    all_rows = np.arange(size)
+    for hand in (house, house, player, player):
+        hand.add(all_rows, shoe.draw(all_rows))
+
+    bet = np.ones(size, np.int8)
+    active = all_rows
+    first_decision = True
+    while active.size:
+        value, soft = player.values(active)
+        double_down = np.isin(value, policy.double_down_on) if first_decision else np.zeros(active.size, np.bool_)
+        hit = ~double_down & (value < np.where(soft, policy.soft_stand, policy.hard_stand))
+        bet[active[double_down]] = 2
+        drawing = active[double_down | hit]
+        player.add(drawing, shoe.draw(drawing))
+        hitting = active[hit]
+        active = hitting[player.values(hitting)[0] < 21]
+        first_decision = False
+
+    player_value = player.values(all_rows)[0]
+    # The house plays out its hand only when the player has not busted, the result is the same either way
+    house_rows = all_rows[player_value <= 21]
+    while house_rows.size:
+        house_rows = house_rows[house.values(house_rows)[0] < 17]
+        house.add(house_rows, shoe.draw(house_rows))
+    house_value = house.values(all_rows)[0]
+
+    player_standing = player_value <= 21
+    win = player_standing & ((house_value > 21) | (player_value > house_value))
+    push = player_standing & (house_value == player_value)
+    blackjack = win & (player_value == 21) & (player.card_count == 2)
+    payout = np.where(win, np.where(blackjack, 3, 2), np.where(push, 1, 0)) * bet
+    return payout - bet, blackjack
+
+
+def simulate(policy: Policy, hands: int, batch_size: int = 1_000_000,
+             seed: Union[int | None] = None) -> SimulationResult:
+    rng = np.random.default_rng(seed)
+    start = perf_counter()
+    total = total_squared = wins = pushes = blackjacks = 0
+    for batch_start in range(0, hands, batch_size):
+        net, blackjack = play_hands(policy, min(batch_size, hands - batch_start), rng)
+        total += int(net.sum())
+        total_squared += int(np.square(net, dtype=np.int64).sum())
+        wins += int((net > 0).sum())
+        pushes += int((net == 0).sum())
+        blackjacks += int(blackjack.sum())
+
+    mean = total / hands
+    variance = total_squared / hands - mean ** 2
+    return SimulationResult(policy=policy.name,
+                            hands=hands,
+                            expected_return=mean,
+                            standard_error=(variance / hands) ** 0.5,
+                            win_rate=wins / hands,
+                            push_rate=pushes / hands,
+                            blackjack_rate=blackjacks / hands,
+                            seconds=perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Estimate the player return of blackjack policies by simulation')
+    parser.add_argument('--hands', type=int, default=10_000_000, help='hands to play per policy')
+    parser.add_argument('--batch-size', type=int, default=1_000_000, help='hands played at once, bounds memory use')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--policy', action='append', choices=POLICIES,
+                        help='policy to simulate, may be repeated, defaults to all of them')
+    arguments = parser.parse_args()
+
+    print(f'{"policy":<20}{"return":>10}{"+/-":>9}{"win":>8}{"push":>8}{"bj":>7}{"hands/s":>13}')
+    for policy_name in arguments.policy or POLICIES:
+        result = simulate(POLICIES[policy_name], arguments.hands, arguments.batch_size, arguments.seed)
+        print(f'{result.policy:<20}{result.expected_return:>+10.4%}{result.standard_error:>9.4%}'
+              f'{result.win_rate:>8.2%}{result.push_rate:>8.2%}{result.blackjack_rate:>7.2%}'
+              f'{result.hands / result.seconds:>13,.0f}')
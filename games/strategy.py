@@ -0,0 +1,166 @@
+import json
+import os
+from functools import cache
+from typing import NamedTuple
+from typing import Union
+from games.assets import DECK_COUNTS
+from games.assets import get_cache_directory
+from games.assets import get_card_value
+from games.assets import write_file_atomically
+
+# Bump whenever BlackJack changes how a hand is played or paid, so cached tables are rebuilt
+_RULES_VERSION = 2
+
+# Index of a busted house in a house outcome, the others are the final values 17 to 21
+_HOUSE_BUST = 5
+
+
+class Hint(NamedTuple):
+    """Expected amount won or lost per unit of the current bet, for every move the player can make"""
+    stand: float
+    # None once the hand is worth 21, the game stands automatically
+    hit: Union[float | None]
+    double_down: Union[float | None]
+    house_bust_chance: float
+
+    @property
+    def best_move(self) -> str:
+        moves = {'stand': self.stand, 'hit': self.hit, 'double down': self.double_down}
+        return max((move for move, value in moves.items() if value is not None), key=moves.get)
+
+
+def _add_card(cards: tuple[int, ...], index: int, count: int = 1) -> tuple[int, ...]:
+    return cards[:index] + (cards[index] + count,) + cards[index + 1:]
+
+
+def _remove_card(cards: tuple[int, ...], index: int) -> tuple[int, ...]:
+    return _add_card(cards, index, -1)
+
+
+def _hand_value(hard_value: int, has_ace: bool) -> int:
+    if has_ace and hard_value + 10 <= 21:
+        return hard_value + 10
+    return hard_value
+
+
+def _stand_payout(player_value: int, card_count: int, house_outcome: tuple[float, ...]) -> float:
+    """Expected payout per unit bet of standing on player_value, matching BlackJack._close_game"""
+    if player_value > 21:
+        return 0.0
+    win_payout = 3 if player_value == 21 and card_count == 2 else 2
+    payout = house_outcome[_HOUSE_BUST] * win_payout
+    for index, probability in enumerate(house_outcome[:_HOUSE_BUST]):
+        house_value = 17 + index
+        if player_value > house_value:
+            payout += probability * win_payout
+        elif player_value == house_value:
+            payout += probability
+    return payout
+
+
+def _build_entries() -> dict[str, list]:
+    @cache
+    def house_outcome(deck: tuple[int, ...], hard_value: int, has_ace: bool) -> tuple[float, ...]:
+        value = _hand_value(hard_value, has_ace)
+        if value >= 17:
+            return tuple(float(value == 17 + index) for index in range(5)) + (float(value > 21),)
+        outcome = [0.0] * 6
+        cards_left = sum(deck)
+        for index, count in enumerate(deck):
+            if count:
+                next_outcome = house_outcome(_remove_card(deck, index), hard_value + index + 1, has_ace or index == 0)
+                for outcome_index, probability in enumerate(next_outcome):
+                    outcome[outcome_index] += count / cards_left * probability
+        return tuple(outcome)
+
+    entries = dict()
+
+    def best_value(player: tuple[int, ...], house_index: int) -> float:
+        key = _entry_key(player, house_index)
+        if key not in entries:
+            entries[key] = evaluate(player, house_index)
+        return max(value for value in entries[key][:3] if value is not None)
+
+    def evaluate(player: tuple[int, ...], house_index: int) -> list:
+        deck = _remove_card(tuple(full - held for full, held in zip(DECK_COUNTS, player)), house_index)
+        hard_value = sum((index + 1) * count for index, count in enumerate(player))
+        has_ace = player[0] > 0
+        player_value = _hand_value(hard_value, has_ace)
+        outcome = house_outcome(deck, house_index + 1, house_index == 0)
+        stand = _stand_payout(player_value, sum(player), outcome) - 1
+        # A hit that reaches 21 stands automatically, only a dealt 21 can still be hit or doubled
+        if player_value > 21 or (player_value == 21 and sum(player) > 2):
+            return [stand, None, None, outcome[_HOUSE_BUST]]
+
+        hit = double_down = 0.0
+        cards_left = sum(deck)
+        for index, count in enumerate(deck):
+            if not count:
+                continue
+            probability = count / cards_left
+            next_player = _add_card(player, index)
+            next_value = _hand_value(hard_value + index + 1, has_ace or index == 0)
+            if next_value > 21:
+                hit -= probability
+                double_down -= 2 * probability
+                continue
+            hit += probability * best_value(next_player, house_index)
+            # Doubling down draws exactly one more card and ends the turn, with twice the bet at stake
+            next_outcome = house_outcome(_remove_card(deck, index), house_index + 1, house_index == 0)
+            double_down += probability * (2 * _stand_payout(next_value, 3, next_outcome) - 2)
+        return [stand, hit, double_down, outcome[_HOUSE_BUST]]
+
+    for house_index in range(10):
+        for first_index in range(10):
+            for second_index in range(first_index, 10):
+                best_value(_add_card(_add_card((0,) * 10, first_index), second_index), house_index)
+    return entries
+
+
+def _entry_key(player: tuple[int, ...], house_index: int) -> str:
+    return f'{",".join(map(str, player))}/{house_index}'
+
+
+class StrategyTable:
+    """Hints for every hand a player can hold against every house card, looked up in one dict access"""
+
+    def __init__(self, entries: dict[str, list]):
+        self._entries = entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_hint(self, player_hand: list[str], house_card: str, can_double_down: bool = True) -> Hint:
+        player = [0] * 10
+        for card_name in player_hand:
+            player[get_card_value(card_name) - 1] += 1
+        stand, hit, double_down, house_bust_chance = self._entries[
+            _entry_key(tuple(player), get_card_value(house_card) - 1)]
+        return Hint(stand=stand,
+                    hit=hit,
+                    double_down=double_down if can_double_down else None,
+                    house_bust_chance=house_bust_chance)
+
+    @classmethod
+    def load(cls, cache_path: str) -> 'StrategyTable':
+        fingerprint = f'{_RULES_VERSION}:{DECK_COUNTS}'
+        try:
+            with open(cache_path) as table_file:
+                table = json.load(table_file)
+            if table['fingerprint'] == fingerprint:
+                return cls(table['entries'])
+        except (OSError, ValueError, KeyError):
+            pass
+
+        entries = _build_entries()
+        try:
+            write_file_atomically(cache_path, json.dumps({'fingerprint': fingerprint, 'entries': entries},
+                                                         separators=(',', ':')).encode())
+        except OSError:
+            pass
+        return cls(entries)
+
+
+@cache
+def get_strategy_table() -> StrategyTable:
+    return StrategyTable.load(os.path.join(get_cache_directory(), 'blackjack_strategy.json'))
@@ -0,0 +1,94 @@
+from os import getenv
+from typing import Union
+from dotenv import load_dotenv
+from sqlalchemy import Engine
+from sqlalchemy import URL
+from sqlalchemy import create_engine
+from sqlalchemy import event
+from sqlalchemy import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.pool import QueuePool
+
+_ASYNC_DRIVERS = {
+    'mysql': 'aiomysql',
+    'sqlite': 'aiosqlite',
+    'postgresql': 'asyncpg'
+}
+
+_SQLITE_PRAGMAS = (
+    # Readers keep reading while a transaction writes, instead of waiting for it
+    'PRAGMA journal_mode=WAL',
+    # Safe with WAL, a commit is only lost if the operating system crashes, not the bot
+    'PRAGMA synchronous=NORMAL',
+    # Wait for the one writer to finish instead of failing with "database is locked"
+    'PRAGMA busy_timeout=5000',
+    # Enforce the foreign keys like InnoDB does
+    'PRAGMA foreign_keys=ON',
+    # 64 MiB page cache per connection
+    'PRAGMA cache_size=-65536',
+    'PRAGMA temp_store=MEMORY'
+)
+
+
+def get_database_url() -> URL:
+    url = getenv('CASINO_DB_URL')
+    if url:
+        return make_url(url)
+    port = getenv('CASINO_DB_PORT')
+    return URL.create('mysql+mysqldb',
+                      username=getenv('CASINO_DB_USER'),
+                      password=getenv('CASINO_DB_PASSWORD'),
+                      host=getenv('CASINO_DB_HOST'),
+                      port=int(port) if port else None,
+                      database='casino')
+
+
+def get_async_database_url(url: URL) -> URL:
+    async_url = getenv('CASINO_DB_ASYNC_URL')
+    if async_url:
+        return make_url(async_url)
+    backend = url.get_backend_name()
+    if backend not in _ASYNC_DRIVERS:
+        raise ValueError(f'No async driver is known for this database, set CASINO_DB_ASYNC_URL: {backend=}')
+    return url.set(drivername=f'{backend}+{_ASYNC_DRIVERS[backend]}')
+
+
+def _get_engine_options(url: URL, pool_class: type) -> dict:
+    options = {
+        'pool_size': int(getenv('CASINO_DB_POOL_SIZE', 5)),
+        'max_overflow': int(getenv('CASINO_DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': float(getenv('CASINO_DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(getenv('CASINO_DB_POOL_RECYCLE', 3600)),
+        'pool_pre_ping': getenv('CASINO_DB_POOL_PRE_PING') == 'TRUE'
+    }
+    if url.get_backend_name() == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            raise ValueError('An in memory SQLite database can not be shared by the sync and async engines, '
+                             'CASINO_DB_URL has to point at a file')
+        # Pooled connections keep their page cache between commands
+        options['poolclass'] = pool_class
+    return options
+
+
+def _configure_sqlite_connection(dbapi_connection, _connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in _SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+def create_engines(url: Union[URL | None] = None) -> tuple[Engine, AsyncEngine]:
+    """Sync engine for migrations and startup, and async engine for the cogs, both for the same database"""
+    url = url or get_database_url()
+    async_url = get_async_database_url(url)
+    engine = create_engine(url, **_get_engine_options(url, QueuePool))
+    async_engine = create_async_engine(async_url, **_get_engine_options(async_url, AsyncAdaptedQueuePool))
+    for configured_engine in (engine, async_engine.sync_engine):
+        if configured_engine.dialect.name == 'sqlite':
+            event.listen(configured_engine, 'connect', _configure_sqlite_connection)
+    return engine, async_engine
+
+
+load_dotenv()
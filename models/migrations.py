@@ -0,0 +1,155 @@
+import hashlib
+import logging
+from argparse import ArgumentParser
+from typing import Union
+from sqlalchemy import Column
+from sqlalchemy import Connection
+from sqlalchemy import Engine
+from sqlalchemy import Index
+from sqlalchemy import Integer
+from sqlalchemy import MetaData
+from sqlalchemy import String
+from sqlalchemy import Table
+from sqlalchemy import delete
+from sqlalchemy import func
+from sqlalchemy import insert
+from sqlalchemy import inspect
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models.model import Base
+from models.model import Games
+from models.model import User
+
+logger = logging.getLogger(__name__)
+
+# Fingerprint of the schema the database was last migrated to, kept out of Base so it is not part of the fingerprint
+_schema_state = Table('casino_schema', MetaData(),
+                      Column('id', Integer, primary_key=True),
+                      Column('fingerprint', String(64), nullable=False))
+
+
+def _check_duplicates(connection: Connection, index: Index):
+    duplicates = connection.execute(
+        select(*index.columns, func.count())
+        .group_by(*index.columns)
+        .having(func.count() > 1)).all()
+    if duplicates:
+        raise RuntimeError(f'Can not create {index.name}, resolve the duplicate rows in {index.table.name} first: '
+                           f'{[tuple(row) for row in duplicates]}')
+
+
+def _create_missing_indexes(connection: Connection):
+    inspector = inspect(connection)
+    for table in Base.metadata.sorted_tables:
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            if index.unique:
+                _check_duplicates(connection, index)
+            logger.info('Creating index %s on %s', index.name, table.name)
+            index.create(connection)
+
+
+def _add_column(connection: Connection, column: Column):
+    column_type = column.type.compile(dialect=connection.dialect)
+    logger.info('Adding column %s to %s', column.name, column.table.name)
+    connection.exec_driver_sql(f'ALTER TABLE {column.table.name} ADD COLUMN {column.name} {column_type} '
+                               f'NOT NULL DEFAULT {column.server_default.arg}')
+
+
+def _add_multiplier_total(connection: Connection):
+    user_columns = {column['name'] for column in inspect(connection).get_columns(User.__tablename__)}
+    if 'multiplier_total' in user_columns:
+        return
+    # Imported here, utils.helpers pulls in nextcord which a startup without this migration does not need yet
+    from utils.helpers import reconcile_multipliers
+
+    _add_column(connection, User.__table__.c.multiplier_total)
+    reconcile_multipliers(Session(connection))
+
+
+def _convert_game_state_to_binary(connection: Connection):
+    column = Games.__table__.c.game_state
+    if connection.dialect.name == 'sqlite':
+        # SQLite keeps the declared type of a column, only the storage class of the old JSON values has to change
+        connection.exec_driver_sql(f'UPDATE {Games.__tablename__} SET {column.name} = CAST({column.name} AS BLOB) '
+                                   f"WHERE typeof({column.name}) = 'text'")
+        return
+    game_columns = {column['name']: column for column in inspect(connection).get_columns(Games.__tablename__)}
+    if game_columns[column.name]['type'].python_type is bytes:
+        return
+    column_type = column.type.compile(dialect=connection.dialect)
+    logger.info('Converting %s.%s to %s', Games.__tablename__, column.name, column_type)
+    connection.exec_driver_sql(f'ALTER TABLE {Games.__tablename__} MODIFY COLUMN {column.name} {column_type} NOT NULL')
+
+
+# Every migration inspects the schema first, so running the whole list again is always safe
+MIGRATIONS = [
+    _create_missing_indexes,
+    _add_multiplier_total,
+    _convert_game_state_to_binary,
+]
+
+
+def get_schema_fingerprint() -> str:
+    """Changes whenever a model gains or changes a table, column or index, or a migration is added"""
+    schema = [migration.__name__ for migration in MIGRATIONS]
+    for table in Base.metadata.sorted_tables:
+        schema.append(table.name)
+        schema.extend(f'{column.name} {column.type} {column.nullable}' for column in table.columns)
+        schema.extend(sorted(f'{index.name} {[column.name for column in index.columns]} {index.unique}'
+                             for index in table.indexes))
+    return hashlib.sha256('\n'.join(schema).encode()).hexdigest()
+
+
+def _read_fingerprint(connection: Connection) -> Union[str | None]:
+    if not inspect(connection).has_table(_schema_state.name):
+        return None
+    return connection.execute(select(_schema_state.c.fingerprint)).scalar()
+
+
+def _write_fingerprint(connection: Connection, fingerprint: str):
+    _schema_state.create(connection, checkfirst=True)
+    connection.execute(delete(_schema_state))
+    connection.execute(insert(_schema_state).values(id=1, fingerprint=fingerprint))
+
+
+def run_migrations(engine: Engine, force: bool = False) -> bool:
+    """Bring a database created by an older version of the bot up to date with the models
+
+    Once the database matches the models its fingerprint is stored, so later starts only read it back instead of
+    inspecting every table again. Returns whether the schema was checked and migrated.
+    """
+    fingerprint = get_schema_fingerprint()
+    if not force:
+        with engine.connect() as connection:
+            if _read_fingerprint(connection) == fingerprint:
+                return False
+
+    Base.metadata.create_all(engine)
+    for migration in MIGRATIONS:
+        with engine.begin() as connection:
+            migration(connection)
+    with engine.begin() as connection:
+        _write_fingerprint(connection, fingerprint)
+    return True
+
+
+if __name__ == '__main__':
+    from models.model import get_engine
+    from utils.helpers import reconcile_multipliers
+
+    parser = ArgumentParser(description='Upgrade the casino database to the current schema')
+    parser.add_argument('--reconcile-multipliers', action='store_true',
+                        help='rebuild every users.multiplier_total from the multipliers table')
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    # Run by hand to repair or upgrade a database, so every migration is checked even if the fingerprint matches
+    run_migrations(get_engine(), force=True)
+    if arguments.reconcile_multipliers:
+        with Session(get_engine()) as session:
+            reconcile_multipliers(session)
+            session.commit()
+        logger.info('Rebuilt the paycheck multiplier of every user')
@@ -1,20 +1,25 @@
 from locale import setlocale
 from locale import currency
 from locale import LC_ALL
+from functools import cache
 from typing import List
 from sqlalchemy import BigInteger
 from sqlalchemy import Integer
 from sqlalchemy import String
+from sqlalchemy import VARBINARY
 from sqlalchemy import ForeignKey
+from sqlalchemy import Index
 from sqlalchemy import DECIMAL
 from sqlalchemy import DATETIME
-from sqlalchemy import create_engine
+from sqlalchemy import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
 from sqlalchemy.orm import relationship
-from os import getenv
-from dotenv import load_dotenv
+from models.database import create_engines
 from decimal import Decimal
 
 MONEY_DEFAULT = Decimal('1000')
@@ -27,10 +32,19 @@ class Base(DeclarativeBase):
 
 class User(Base):
     __tablename__ = 'users'
+    __table_args__ = (
+        # Every command looks the user up by these two columns
+        Index('uq_users_discord_id_guild_id', 'discord_id', 'guild_id', unique=True),
+        # Covers the /leaderboard query, so the richest players are read from the index alone
+        Index('ix_users_guild_id_money', 'guild_id', 'money', 'discord_id'),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     discord_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
     guild_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
     money: Mapped[DECIMAL] = mapped_column(DECIMAL(scale=2, precision=30), nullable=False, default=MONEY_DEFAULT)
+    # Running SUM of multipliers.stat_multiplier, kept up to date when a degree is purchased
+    multiplier_total: Mapped[DECIMAL] = mapped_column(DECIMAL(scale=2, precision=30), nullable=False,
+                                                      default=Decimal('0'), server_default='0')
     job: Mapped['Job'] = relationship(back_populates='user')
     pet: Mapped['Pet'] = relationship(back_populates='user', foreign_keys='Pet.user_id')
     multipliers: Mapped[List['Multipliers']] = relationship(back_populates='user')
@@ -51,6 +65,8 @@ class User(Base):
 
 class Job(Base):
     __tablename__ = 'jobs'
+    # Covers the payroll join from users to the jobs whose paycheck is due
+    __table_args__ = (Index('ix_jobs_user_id_paycheck_redeemed', 'user_id', 'paycheck_redeemed'),)
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'))
     user: Mapped['User'] = relationship(back_populates='job')
@@ -71,6 +87,8 @@ class Job(Base):
 
 class Multipliers(Base):
     __tablename__ = 'multipliers'
+    # Covers the paycheck SUM(stat_multiplier) per user without reading the table rows
+    __table_args__ = (Index('ix_multipliers_user_id_stat_multiplier', 'user_id', 'stat_multiplier'),)
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'))
     user: Mapped['User'] = relationship(back_populates='multipliers')
@@ -111,11 +129,14 @@ class Pet(Base):
 
 class Games(Base):
     __tablename__ = 'games'
+    # A user has at most one active game of each type
+    __table_args__ = (Index('uq_games_user_id_game_type', 'user_id', 'game_type', unique=True),)
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'))
     user: Mapped['User'] = relationship(back_populates='games')
     game_type: Mapped[str] = mapped_column(String(32), nullable=False)
-    game_state: Mapped[str] = mapped_column(String(2000), nullable=False)
+    # Written by games/codec.py, rows from before the codec still hold JSON text
+    game_state: Mapped[bytes] = mapped_column(VARBINARY(2000), nullable=False)
 
     def __str__(self):
         return f'Games:\n' \
@@ -125,10 +146,29 @@ class Games(Base):
                f'\tgame_state: {self.game_state}\n'
 
 
-load_dotenv()
-engine = create_engine(f'mysql+mysqldb://{getenv("CASINO_DB_USER")}:{getenv("CASINO_DB_PASSWORD")}@'
-                       f'{getenv("CASINO_DB_HOST")}:{getenv("CASINO_DB_PORT")}/casino', pool_recycle=3600)
-Base.metadata.create_all(engine)
+@cache
+def _get_engines() -> tuple[Engine, AsyncEngine]:
+    # Created on first use rather than at import, so the models can be imported without a database server
+    return create_engines()
+
+
+def get_engine() -> Engine:
+    return _get_engines()[0]
+
+
+def get_async_engine() -> AsyncEngine:
+    return _get_engines()[1]
+
+
+@cache
+def _get_session_factory() -> async_sessionmaker:
+    # Cogs keep reading attributes such as user.money after committing, which an expired object can not do without I/O
+    return async_sessionmaker(get_async_engine(), expire_on_commit=False)
+
+
+def async_session() -> AsyncSession:
+    return _get_session_factory()()
+
 
 if __name__ == '__main__':
     setlocale(LC_ALL, 'en_US')
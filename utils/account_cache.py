@@ -0,0 +1,76 @@
+from collections import OrderedDict
+from decimal import Decimal
+from os import getenv
+from time import monotonic
+from typing import NamedTuple
+from typing import Union
+
+
+class AccountSnapshot(NamedTuple):
+    """Read only copy of the account fields shown by /account view, safe to keep after the session closes"""
+    user_id: int
+    discord_id: int
+    guild_id: int
+    money: Decimal
+    multiplier_total: Decimal
+    job_title: Union[str | None]
+    job_company: Union[str | None]
+    pet_name: str
+    # None when the bot is holding the pet
+    pet_owner_discord_id: Union[int | None]
+
+
+class AccountCache:
+    """Bounded, TTL evicting cache of account snapshots keyed by (guild_id, discord_id).
+
+    Entries are written through by the session hooks in utils/helpers.py when a transaction that changed the
+    account commits, so the TTL only bounds how long a change made outside the bot can stay invisible.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple[int, int], tuple[float, AccountSnapshot]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, guild_id: int, discord_id: int) -> Union[AccountSnapshot | None]:
+        key = (guild_id, discord_id)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, snapshot: AccountSnapshot):
+        key = (snapshot.guild_id, snapshot.discord_id)
+        self._entries[key] = (monotonic() + self.ttl_seconds, snapshot)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, guild_id: int, discord_id: int):
+        self._entries.pop((guild_id, discord_id), None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+
+account_cache = AccountCache(int(getenv('CASINO_ACCOUNT_CACHE_SIZE', 10000)),
+                             float(getenv('CASINO_ACCOUNT_CACHE_TTL', 300)))
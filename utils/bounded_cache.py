@@ -0,0 +1,70 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Any
+from typing import Callable
+from typing import Hashable
+
+
+class BoundedCache:
+    """Least recently used cache bounded by the total size of its values instead of their count.
+
+    size_of decides what a value costs, by default every value costs 1 so max_size is an entry count.
+    """
+
+    def __init__(self, max_size: int, size_of: Callable[[Any], int] = lambda value: 1):
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._size_of = size_of
+        self._entries: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        # Renders can run on the default thread pool, so entries are only touched while holding the lock
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any):
+        value_size = self._size_of(value)
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+            if value_size > self.max_size:
+                return
+            self._entries[key] = (value, value_size)
+            self.size += value_size
+            while self.size > self.max_size:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def keys(self) -> list[Hashable]:
+        with self._lock:
+            return list(self._entries)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return default
+            self.size -= entry[1]
+            return entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
@@ -0,0 +1,38 @@
+from decimal import Decimal
+from locale import currency
+from datetime import timedelta
+from typing import Union
+
+
+def format_money(amount: Union[Decimal | int | float]) -> str:
+    return currency(amount, grouping=True)
+
+
+def format_timedelta(time: timedelta) -> str:
+    seconds_in_hour: int = 3600
+    seconds_in_minute: int = 60
+
+    time_list = []
+    remaining_seconds: int = int(time.total_seconds())
+    if remaining_seconds >= seconds_in_hour:
+        remaining_hours = remaining_seconds // seconds_in_hour
+        time_list.append(f'{remaining_hours} hour' + ('s' if remaining_hours != 1 else ''))
+        remaining_seconds %= seconds_in_hour
+
+    if remaining_seconds >= seconds_in_minute:
+        remaining_minutes = remaining_seconds // seconds_in_minute
+        time_list.append(f'{remaining_minutes} minute' + ('s' if remaining_minutes != 1 else ''))
+        remaining_seconds %= seconds_in_minute
+
+    if remaining_seconds:
+        time_list.append(f'{remaining_seconds} second' + ('s' if remaining_seconds != 1 else ''))
+
+    if len(time_list) > 1:
+        time_string: str = ', '.join(time_list[0:-1])
+        time_string += ', and ' + time_list[-1]
+    elif len(time_list) == 0:
+        time_string = '0 seconds'
+    else:
+        time_string = time_list[0]
+
+    return time_string
@@ -1,91 +1,237 @@
+import asyncio
 import nextcord
+from itertools import chain
+from sqlalchemy import event
+from sqlalchemy import inspect
 from sqlalchemy import select
+from sqlalchemy import update
 from sqlalchemy import func
 from sqlalchemy.orm import Session
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Union
 from models.model import User
+from models.model import Job
+from models.model import Pet
 from models.model import Multipliers
-from models.model import Games
-from decimal import Decimal
-from locale import currency
+from utils.account_cache import AccountSnapshot
+from utils.account_cache import account_cache
+from utils.leaderboard import leaderboards
+from utils.metrics import record_deferral
+from utils.metrics import record_followup
+from utils.metrics import record_response
+from datetime import datetime
 from datetime import timedelta
+from datetime import timezone
+from decimal import Decimal
+from time import perf_counter
 
 
-def get_user(session: Session, discord_id: int, guild_id: int) -> Union[None | User]:
-    return session.execute(select(User).filter_by(discord_id=discord_id, guild_id=guild_id)).scalar()
+# AsyncSession can not lazy load, so every relationship the cogs read is loaded together with the user
+_USER_LOAD_OPTIONS = (
+    joinedload(User.job),
+    joinedload(User.pet).joinedload(Pet.current_owner)
+)
 
 
-def pay_user(user: User, amount: Decimal):
-    user.money += amount
+async def get_user_async(session: AsyncSession, discord_id: int, guild_id: int) -> Union[None | User]:
+    user: Union[User | None] = (await session.execute(
+        select(User)
+        .options(*_USER_LOAD_OPTIONS)
+        .filter_by(discord_id=discord_id, guild_id=guild_id))) \
+        .scalar()
+    if user is not None:
+        _cache_account(user)
+    return user
+
+
+async def get_account_snapshot_async(session: AsyncSession, discord_id: int,
+                                     guild_id: int) -> Union[None | AccountSnapshot]:
+    """Read only view of an account, served from the account cache when possible"""
+    account = account_cache.get(guild_id, discord_id)
+    if account is None:
+        user = await get_user_async(session, discord_id, guild_id)
+        if user is not None:
+            account = create_account_snapshot(user)
+    return account
+
+
+def create_account_snapshot(user: User) -> Union[None | AccountSnapshot]:
+    """Snapshot of the user, or None when a field it needs is not loaded and reading it would query the database"""
+    user_state = inspect(user)
+    if user_state.was_deleted or user_state.unloaded & {'id', 'discord_id', 'guild_id', 'money', 'multiplier_total',
+                                                         'job', 'pet'}:
+        return None
+    if user.pet is None or inspect(user.pet).unloaded & {'name', 'current_owner_id'}:
+        return None
+    if user.job is not None and inspect(user.job).unloaded & {'title', 'company'}:
+        return None
+
+    if user.pet.current_owner_id is None:
+        pet_owner_discord_id = None
+    elif user.pet.current_owner_id == user.id:
+        pet_owner_discord_id = user.discord_id
+    elif 'current_owner' in inspect(user.pet).unloaded:
+        return None
+    else:
+        pet_owner_discord_id = user.pet.current_owner.discord_id
+
+    return AccountSnapshot(user_id=user.id,
+                           discord_id=user.discord_id,
+                           guild_id=user.guild_id,
+                           money=user.money,
+                           multiplier_total=user.multiplier_total,
+                           job_title=user.job.title if user.job else None,
+                           job_company=user.job.company if user.job else None,
+                           pet_name=user.pet.name,
+                           pet_owner_discord_id=pet_owner_discord_id)
+
+
+def _cache_account(user: User):
+    account = create_account_snapshot(user)
+    if account is not None:
+        account_cache.put(account)
+
+
+_ACCOUNT_CACHE_STAGED = 'account_cache_staged'
+
+
+def stage_account_update(session: Union[Session | AsyncSession], user: User):
+    """Write the user through to the account cache and the leaderboard once the session commits"""
+    if isinstance(session, AsyncSession):
+        session = session.sync_session
+    if inspect(user).unloaded & {'discord_id', 'guild_id'}:
+        return
+    session.info.setdefault(_ACCOUNT_CACHE_STAGED, dict())[(user.guild_id, user.discord_id)] = user
+
+
+@event.listens_for(Session, 'after_flush')
+def _stage_flushed_accounts(session: Session, _flush_context):
+    for instance in chain(session.new, session.dirty, session.deleted):
+        if isinstance(instance, User):
+            stage_account_update(session, instance)
+        elif isinstance(instance, (Job, Pet, Multipliers)):
+            # The owning user is only staged when already loaded, reading it here could emit a query mid flush
+            user = inspect(instance).attrs.user.loaded_value
+            if isinstance(user, User):
+                stage_account_update(session, user)
+
+
+@event.listens_for(Session, 'after_commit')
+def _write_through_accounts(session: Session):
+    for (guild_id, discord_id), user in session.info.pop(_ACCOUNT_CACHE_STAGED, dict()).items():
+        account = create_account_snapshot(user)
+        if account is None:
+            account_cache.invalidate(guild_id, discord_id)
+        else:
+            account_cache.put(account)
+        _update_leaderboard(guild_id, discord_id, user)
+
+
+def _update_leaderboard(guild_id: int, discord_id: int, user: User):
+    user_state = inspect(user)
+    if user_state.was_deleted:
+        leaderboards.remove(guild_id, discord_id)
+    elif 'money' in user_state.unloaded:
+        leaderboards.evict(guild_id)
+    else:
+        leaderboards.update(guild_id, discord_id, user.money)
 
 
-def charge_user(user: User, cost: Decimal):
-    user.money -= cost
+@event.listens_for(Session, 'after_rollback')
+def _discard_staged_accounts(session: Session):
+    session.info.pop(_ACCOUNT_CACHE_STAGED, None)
 
 
-def get_multipliers(user: User) -> Union[Decimal]:
-    multipliers_sum: Union[Decimal | None] = Session.object_session(user).execute(
-        select(func.sum(Multipliers.stat_multiplier))
-        .where(Multipliers.user_id == user.id)
-        .group_by('user_id')).scalar()
-    if multipliers_sum is None:
-        return Decimal('1.0')
+async def _update_user_column(session: AsyncSession, user: User, column, statement) -> Union[Decimal | None]:
+    statement = statement.execution_options(synchronize_session=False)
+    if session.bind.dialect.update_returning:
+        new_value: Union[Decimal | None] = (await session.execute(statement.returning(column))).scalar()
     else:
-        return multipliers_sum + Decimal('1.0')
+        # MySQL has no UPDATE ... RETURNING, the matched row count tells whether the update applied
+        if (await session.execute(statement)).rowcount == 0:
+            return None
+        new_value = (await session.execute(select(column).where(User.id == user.id))).scalar()
+    if new_value is None:
+        return None
 
+    # The row is already up to date, so the loaded user is refreshed without marking it dirty
+    set_committed_value(user, column.key, new_value)
+    stage_account_update(session, user)
+    return new_value
 
-def get_active_game(user: User, game_type: str) -> Games:
-    return Session.object_session(user).execute(
-        select(Games)
-        .filter_by(user_id=user.id, game_type=game_type)) \
-        .scalar()
 
+async def charge_user_async(session: AsyncSession, user: User, cost: Decimal) -> Union[Decimal | None]:
+    """Take cost from the balance in one conditional UPDATE, returning the new balance or None if it is too low
 
-def register_new_game(user: User, game_type: str, game_state: str) -> Games:
-    game = Games(game_type=game_type, game_state=game_state)
-    user.games.append(game)
-    return game
+    The balance check happens inside the UPDATE, so concurrent charges can not overdraw the account.
+    """
+    return await _update_user_column(session, user, User.money,
+                                     update(User)
+                                     .where(User.id == user.id, User.money >= cost)
+                                     .values(money=User.money - cost))
 
 
-def format_money(amount: Union[Decimal | int | float]) -> str:
-    return currency(amount, grouping=True)
+async def pay_user_async(session: AsyncSession, user: User, amount: Decimal) -> Decimal:
+    """Add amount to the balance in one UPDATE, returning the new balance"""
+    return await _update_user_column(session, user, User.money,
+                                     update(User)
+                                     .where(User.id == user.id)
+                                     .values(money=User.money + amount))
 
 
-def format_timedelta(time: timedelta) -> str:
-    seconds_in_hour: int = 3600
-    seconds_in_minute: int = 60
+async def add_multiplier_async(session: AsyncSession, user: User, multiplier: Decimal) -> Decimal:
+    """Add multiplier to the running multiplier total in one UPDATE, returning the new total"""
+    return await _update_user_column(session, user, User.multiplier_total,
+                                     update(User)
+                                     .where(User.id == user.id)
+                                     .values(multiplier_total=User.multiplier_total + multiplier))
 
-    time_list = []
-    remaining_seconds: int = int(time.total_seconds())
-    if remaining_seconds >= seconds_in_hour:
-        remaining_hours = remaining_seconds // seconds_in_hour
-        time_list.append(f'{remaining_hours} hour' + ('s' if remaining_hours != 1 else ''))
-        remaining_seconds %= seconds_in_hour
 
-    if remaining_seconds >= seconds_in_minute:
-        remaining_minutes = remaining_seconds // seconds_in_minute
-        time_list.append(f'{remaining_minutes} minute' + ('s' if remaining_minutes != 1 else ''))
-        remaining_seconds %= seconds_in_minute
+def get_multipliers(user: Union[User | AccountSnapshot]) -> Union[Decimal]:
+    return user.multiplier_total + Decimal('1.0')
 
-    if remaining_seconds:
-        time_list.append(f'{remaining_seconds} second' + ('s' if remaining_seconds != 1 else ''))
 
-    if len(time_list) > 1:
-        time_string: str = ', '.join(time_list[0:-1])
-        time_string += ', and ' + time_list[-1]
-    elif len(time_list) == 0:
-        time_string = '0 seconds'
-    else:
-        time_string = time_list[0]
+def reconcile_multipliers(session: Session):
+    """Rebuild users.multiplier_total from the multipliers table"""
+    session.execute(
+        update(User)
+        .values(multiplier_total=func.coalesce(
+            select(func.sum(Multipliers.stat_multiplier))
+            .where(Multipliers.user_id == User.id)
+            .scalar_subquery(), 0)))
+
+
+# Discord shows "The application did not respond" unless an interaction is answered or deferred within this time
+INTERACTION_DEADLINE = timedelta(seconds=3)
 
-    return time_string
+
+async def defer_response(interaction: nextcord.Interaction):
+    """Acknowledge the interaction right away, send_response then has 15 minutes to answer instead of 3 seconds"""
+    if not interaction.response.is_done():
+        await interaction.response.defer()
+        record_deferral()
 
 
 async def send_response(interaction: nextcord.Interaction, **kwargs):
+    start = perf_counter()
     if interaction.response.is_done():
+        record_followup(datetime.now(timezone.utc) - interaction.created_at > INTERACTION_DEADLINE)
         await interaction.followup.send(**kwargs)
     else:
         await interaction.response.send_message(**kwargs)
+    record_response(perf_counter() - start)
+
+
+async def send_table_response(interaction: nextcord.Interaction, embed: nextcord.Embed, table_image: asyncio.Future,
+                              filename: str):
+    """Send the embed with the table image once it is rendered, or without it if a newer table superseded it"""
+    image = await table_image
+    if image is None:
+        await send_response(interaction, embed=embed)
+        return
+    await send_response(interaction, embed=embed, file=nextcord.File(fp=image, filename=filename))
 
 
 async def send_error_message(interaction: nextcord.Interaction, error_title: str, error_message: str):
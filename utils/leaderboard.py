@@ -0,0 +1,154 @@
+import asyncio
+from bisect import insort
+from collections import OrderedDict
+from decimal import Decimal
+from os import getenv
+from time import monotonic
+from typing import Union
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.model import User
+
+
+class GuildLeaderboard:
+    """The richest players of one guild, kept exact while balances change without asking the database again.
+
+    The board holds up to capacity players. Every player missing from it has at most threshold money, so a player
+    who earns more than threshold is added, and one who drops to threshold or below is removed. The board can
+    only answer for as many players as it still holds, once it shrinks below that it has to be reloaded.
+    """
+
+    def __init__(self, rows: list[tuple[int, Decimal]], capacity: int):
+        self.capacity = capacity
+        self.loaded_at = monotonic()
+        self._balances: dict[int, Decimal] = dict(rows)
+        # Sorted richest first, ties broken by discord_id
+        self._entries: list[tuple[Decimal, int]] = sorted((-money, discord_id) for discord_id, money in rows)
+        # None when the whole guild fits on the board
+        self._threshold: Union[Decimal | None] = -self._entries[-1][0] if len(rows) >= capacity else None
+
+    def update(self, discord_id: int, money: Decimal):
+        self.remove(discord_id)
+        if self._threshold is not None and money <= self._threshold:
+            return
+        self._balances[discord_id] = money
+        insort(self._entries, (-money, discord_id))
+        if len(self._entries) > self.capacity:
+            negative_money, dropped_discord_id = self._entries.pop()
+            del self._balances[dropped_discord_id]
+            self._threshold = -negative_money if self._threshold is None else max(self._threshold, -negative_money)
+
+    def remove(self, discord_id: int):
+        money = self._balances.pop(discord_id, None)
+        if money is not None:
+            self._entries.remove((-money, discord_id))
+
+    def top(self, count: int) -> Union[list[tuple[int, Decimal]] | None]:
+        """The count richest players as (discord_id, money), or None if the board no longer knows who they are"""
+        if len(self._entries) < count and self._threshold is not None:
+            return None
+        return [(discord_id, -negative_money) for negative_money, discord_id in self._entries[:count]]
+
+
+class LeaderboardCache:
+    """Boards of the most recently viewed guilds.
+
+    Balance changes are applied by the session hooks in utils/helpers.py when their transaction commits. A board
+    is only read from the database the first time its guild is viewed, after it was evicted or expired, or when
+    so many of its players lost money that it no longer holds a full top list.
+    """
+
+    def __init__(self, max_guilds: int, capacity: int, ttl_seconds: float):
+        self.max_guilds = max_guilds
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self.loads = 0
+        self._boards: OrderedDict[int, GuildLeaderboard] = OrderedDict()
+        # Changes committed while a board is being read, applied on top of what the read returns
+        self._loading: dict[int, list[tuple[int, Union[Decimal | None]]]] = dict()
+        self._load_lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._boards)
+
+    async def get_top(self, session: AsyncSession, guild_id: int, count: int) -> list[tuple[int, Decimal]]:
+        if count > self.capacity:
+            raise ValueError(f'Value supplied for count is larger than the board capacity: {count=}')
+        board = self._get(guild_id)
+        top = board.top(count) if board is not None else None
+        if top is None:
+            async with self._load_lock:
+                board = self._get(guild_id)
+                top = board.top(count) if board is not None else None
+                if top is None:
+                    top = (await self._load(session, guild_id)).top(count)
+        return top
+
+    def update(self, guild_id: int, discord_id: int, money: Decimal):
+        if guild_id in self._loading:
+            self._loading[guild_id].append((discord_id, money))
+        board = self._boards.get(guild_id)
+        if board is not None:
+            board.update(discord_id, money)
+
+    def remove(self, guild_id: int, discord_id: int):
+        if guild_id in self._loading:
+            self._loading[guild_id].append((discord_id, None))
+        board = self._boards.get(guild_id)
+        if board is not None:
+            board.remove(discord_id)
+
+    def evict(self, guild_id: int):
+        self._boards.pop(guild_id, None)
+
+    def clear(self):
+        self._boards.clear()
+
+    def stats(self) -> dict:
+        return {
+            'guilds': len(self._boards),
+            'loads': self.loads
+        }
+
+    def _get(self, guild_id: int) -> Union[GuildLeaderboard | None]:
+        board = self._boards.get(guild_id)
+        if board is None:
+            return None
+        if board.loaded_at + self.ttl_seconds < monotonic():
+            del self._boards[guild_id]
+            return None
+        self._boards.move_to_end(guild_id)
+        return board
+
+    async def _load(self, session: AsyncSession, guild_id: int) -> GuildLeaderboard:
+        self._loading[guild_id] = []
+        try:
+            # Served by ix_users_guild_id_money without touching the table rows
+            rows = (await session.execute(
+                select(User.discord_id, User.money)
+                .where(User.guild_id == guild_id)
+                .order_by(User.money.desc())
+                .limit(self.capacity))).all()
+        finally:
+            changes = self._loading.pop(guild_id)
+        self.loads += 1
+
+        board = GuildLeaderboard([(row.discord_id, row.money) for row in rows], self.capacity)
+        for discord_id, money in changes:
+            if money is None:
+                board.remove(discord_id)
+            else:
+                board.update(discord_id, money)
+        self._boards[guild_id] = board
+        self._boards.move_to_end(guild_id)
+        while len(self._boards) > self.max_guilds:
+            self._boards.popitem(last=False)
+        return board
+
+
+LEADERBOARD_LENGTH = 10
+
+leaderboards = LeaderboardCache(int(getenv('CASINO_LEADERBOARD_GUILDS', 1000)),
+                                # The board has to hold at least the players /leaderboard shows
+                                max(int(getenv('CASINO_LEADERBOARD_CAPACITY', 50)), LEADERBOARD_LENGTH),
+                                float(getenv('CASINO_LEADERBOARD_TTL', 3600)))
@@ -0,0 +1,36 @@
+import asyncio
+import nextcord
+from contextlib import asynccontextmanager
+from weakref import WeakValueDictionary
+
+
+class UserLockRegistry:
+    """One asyncio lock per (guild_id, discord_id), serializing the commands of a user inside this process.
+
+    Only the commands holding or waiting on a lock keep it alive, the registry holds weak references, so a lock
+    disappears as soon as the user's last command finishes and idle users cost no memory.
+    """
+
+    def __init__(self):
+        self._locks: WeakValueDictionary[tuple[int, int], asyncio.Lock] = WeakValueDictionary()
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    def get(self, guild_id: int, discord_id: int) -> asyncio.Lock:
+        key = (guild_id, discord_id)
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[key] = lock
+        return lock
+
+
+user_locks = UserLockRegistry()
+
+
+@asynccontextmanager
+async def user_lock(interaction: nextcord.Interaction):
+    """Run the block while no other game or economy command of the same user is running"""
+    async with user_locks.get(interaction.guild.id, interaction.user.id):
+        yield
@@ -0,0 +1,295 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from os import getenv
+from time import perf_counter
+from typing import Union
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+class Histogram:
+    """Counts of observed values per command, bucketed by fixed upper bounds like a Prometheus histogram"""
+
+    def __init__(self, name: str, description: str, buckets: tuple[float, ...]):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        # Count per bucket of every command, the last bucket holds the values above every bound
+        self._counts: dict[str, list[int]] = dict()
+        self._sums: dict[str, float] = dict()
+
+    def observe(self, command: str, value: float):
+        counts = self._counts.get(command)
+        if counts is None:
+            counts = self._counts[command] = [0] * (len(self.buckets) + 1)
+            self._sums[command] = 0.0
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[command] += value
+
+    def commands(self) -> list[str]:
+        return sorted(self._counts)
+
+    def count(self, command: str) -> int:
+        return sum(self._counts.get(command, ()))
+
+    def total(self, command: str) -> float:
+        return self._sums.get(command, 0.0)
+
+    def quantile(self, command: str, quantile: float) -> Union[float | None]:
+        """Estimated by interpolating inside the bucket the quantile falls in, like Prometheus histogram_quantile"""
+        count = self.count(command)
+        if count == 0:
+            return None
+        rank = quantile * count
+        seen = 0
+        for index, bucket_count in enumerate(self._counts[command]):
+            if seen + bucket_count >= rank and bucket_count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower_bound = self.buckets[index - 1] if index else 0.0
+                return lower_bound + (self.buckets[index] - lower_bound) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def export(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        for command in self.commands():
+            label = _escape_label(command)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), self._counts[command]):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{{command="{label}",le="{le}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{command="{label}"}} {self._sums[command]}')
+            lines.append(f'{self.name}_count{{command="{label}"}} {cumulative}')
+        return lines
+
+
+class Counter:
+    """Number of times something happened per command, like a Prometheus counter"""
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._counts: dict[str, int] = dict()
+
+    def increment(self, command: str):
+        self._counts[command] = self._counts.get(command, 0) + 1
+
+    def count(self, command: str) -> int:
+        return self._counts.get(command, 0)
+
+    def export(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} counter']
+        for command in sorted(self._counts):
+            label = _escape_label(command)
+            lines.append(f'{self.name}{{command="{label}"}} {self._counts[command]}')
+        return lines
+
+
+class Gauge:
+    """A single value that goes up and down, like a Prometheus gauge"""
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.value = 0
+
+    def set(self, value: float):
+        self.value = value
+
+    def export(self) -> list[str]:
+        return [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} gauge', f'{self.name} {self.value}']
+
+
+_SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+command_seconds = Histogram('casino_command_seconds', 'Total time spent handling a command', _SECONDS_BUCKETS)
+db_seconds = Histogram('casino_command_db_seconds', 'Time a command spent waiting on database queries',
+                       _SECONDS_BUCKETS)
+db_queries = Histogram('casino_command_db_queries', 'Database queries issued by a command',
+                       (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 50))
+render_seconds = Histogram('casino_command_render_seconds', 'Time a command spent rendering table images',
+                           _SECONDS_BUCKETS)
+image_bytes = Histogram('casino_command_image_bytes', 'Size of the encoded table images a command uploaded',
+                        (16_384, 65_536, 131_072, 262_144, 524_288, 1_048_576, 2_097_152, 4_194_304, 8_388_608))
+response_seconds = Histogram('casino_command_response_seconds', 'Time a command spent sending responses to Discord',
+                             _SECONDS_BUCKETS)
+
+deferred_responses = Counter('casino_command_deferred_total',
+                             'Commands that deferred their interaction and answered with a followup')
+late_responses = Counter('casino_command_late_total',
+                         'Deferred commands whose response was ready after the interaction deadline, '
+                         'which would have failed without deferring')
+superseded_renders = Counter('casino_command_superseded_renders_total',
+                             'Table images a command did not upload because a newer action of the user replaced them '
+                             'while they waited in the render queue')
+cached_images = Counter('casino_command_cached_images_total',
+                        'Table images a command uploaded from the image cache without rendering them')
+
+render_queue_depth = Gauge('casino_render_queue_depth', 'Table images waiting in the render queue')
+image_cache_bytes = Gauge('casino_image_cache_bytes', 'Size of the encoded table images kept in the image cache')
+image_cache_hit_rate = Gauge('casino_image_cache_hit_rate', 'Share of table images served from the image cache')
+payroll_users_per_second = Gauge('casino_payroll_users_per_second', 'Users paid per second by the last payroll run')
+
+HISTOGRAMS = (command_seconds, db_seconds, db_queries, render_seconds, image_bytes, response_seconds)
+COUNTERS = (deferred_responses, late_responses, superseded_renders, cached_images)
+GAUGES = (render_queue_depth, image_cache_bytes, image_cache_hit_rate, payroll_users_per_second)
+
+
+class CommandMeasurement:
+    def __init__(self, command: str):
+        self.command = command
+        self.started = perf_counter()
+        self.db_seconds = 0.0
+        self.db_queries = 0
+        self.renders = 0
+        self.render_seconds = 0.0
+        self.image_bytes = 0
+        self.response_seconds = 0.0
+        self.deferred = False
+        self.late = False
+
+
+# Measurement of the command the current task runs for, concurrent commands never share one
+_current_command: ContextVar[Union[CommandMeasurement | None]] = ContextVar('current_command', default=None)
+
+
+def start_command(command: str):
+    _current_command.set(CommandMeasurement(command))
+
+
+def finish_command():
+    measurement = _current_command.get()
+    if measurement is None:
+        return
+    _current_command.set(None)
+    command = measurement.command
+    command_seconds.observe(command, perf_counter() - measurement.started)
+    db_seconds.observe(command, measurement.db_seconds)
+    db_queries.observe(command, measurement.db_queries)
+    response_seconds.observe(command, measurement.response_seconds)
+    # Cache hits upload an image too, but only real renders count towards the render time
+    if measurement.renders:
+        render_seconds.observe(command, measurement.render_seconds)
+    if measurement.image_bytes:
+        image_bytes.observe(command, measurement.image_bytes)
+    if measurement.deferred:
+        deferred_responses.increment(command)
+        if measurement.late:
+            late_responses.increment(command)
+
+
+def record_render(seconds: float, encoded_bytes: int):
+    measurement = _current_command.get()
+    if measurement is not None:
+        measurement.renders += 1
+        measurement.render_seconds += seconds
+        measurement.image_bytes += encoded_bytes
+
+
+def record_cached_image(encoded_bytes: int):
+    measurement = _current_command.get()
+    if measurement is not None:
+        measurement.image_bytes += encoded_bytes
+        cached_images.increment(measurement.command)
+
+
+def record_superseded_render():
+    measurement = _current_command.get()
+    if measurement is not None:
+        superseded_renders.increment(measurement.command)
+
+
+def record_response(seconds: float):
+    measurement = _current_command.get()
+    if measurement is not None:
+        measurement.response_seconds += seconds
+
+
+def record_deferral():
+    measurement = _current_command.get()
+    if measurement is not None:
+        measurement.deferred = True
+
+
+def record_followup(late: bool):
+    measurement = _current_command.get()
+    if measurement is not None:
+        measurement.late = measurement.late or late
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query(conn, _cursor, _statement, _parameters, _context, _executemany):
+    if _current_command.get() is not None:
+        conn.info.setdefault('query_started', []).append(perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _finish_query(conn, _cursor, _statement, _parameters, _context, _executemany):
+    measurement = _current_command.get()
+    query_started = conn.info.get('query_started')
+    if measurement is not None and query_started:
+        measurement.db_seconds += perf_counter() - query_started.pop()
+        measurement.db_queries += 1
+
+
+@event.listens_for(Engine, 'handle_error')
+def _discard_failed_query(exception_context):
+    # after_cursor_execute does not run for a failed query, so its start time would be taken by the next one
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_started'):
+        connection.info['query_started'].pop()
+
+
+def export_metrics() -> str:
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.export())
+    for counter in COUNTERS:
+        lines.extend(counter.export())
+    for gauge in GAUGES:
+        lines.extend(gauge.export())
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """Serves export_metrics() over HTTP for a Prometheus scraper, on the bot's own event loop"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def start(self):
+        if self._runner is not None or self.port == 0:
+            return
+        # Only imported when the endpoint is enabled, the render workers import this module too
+        from aiohttp import web
+
+        application = web.Application()
+        application.router.add_get('/metrics', self._serve)
+        self._runner = web.AppRunner(application, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @staticmethod
+    async def _serve(_request):
+        from aiohttp import web
+
+        return web.Response(body=export_metrics().encode(),
+                            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+
+load_dotenv()
+metrics_server = MetricsServer(getenv('CASINO_METRICS_HOST', '127.0.0.1'), int(getenv('CASINO_METRICS_PORT', 0)))
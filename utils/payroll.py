@@ -0,0 +1,161 @@
+import asyncio
+import logging
+from datetime import datetime
+from datetime import timedelta
+from decimal import Decimal
+from os import getenv
+from time import perf_counter
+from typing import Union
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+from models.model import Job
+from models.model import User
+from models.model import async_session
+from utils.account_cache import account_cache
+from utils.leaderboard import leaderboards
+from utils.metrics import payroll_users_per_second
+
+logger = logging.getLogger(__name__)
+
+PAYCHECK_INTERVAL: timedelta = timedelta(minutes=10)
+BASE_PAY: Decimal = Decimal('100')
+
+# The same amount /job paycheck pays, BASE_PAY times get_multipliers(user)
+_PAYCHECK_AMOUNT = (User.multiplier_total + Decimal('1.0')) * BASE_PAY
+
+
+async def claim_paycheck_async(session: AsyncSession, job: Job, now: datetime) -> bool:
+    """Mark the paycheck of job as redeemed if it is due, returning False if it is not
+
+    The check happens inside the UPDATE, so a paycheck can not be paid twice by concurrent commands or the payroll.
+    """
+    result = await session.execute(
+        update(Job)
+        .where(Job.id == job.id, Job.paycheck_redeemed <= now - PAYCHECK_INTERVAL)
+        .values(paycheck_redeemed=now)
+        .execution_options(synchronize_session=False))
+    if result.rowcount == 0:
+        return False
+    set_committed_value(job, 'paycheck_redeemed', now)
+    return True
+
+
+async def _pay_batch(session: AsyncSession, guild_id: int, first_id: int, last_id: int, now: datetime) -> int:
+    due = (Job.paycheck_redeemed <= now - PAYCHECK_INTERVAL)
+    in_batch = (User.guild_id == guild_id) & User.id.between(first_id, last_id)
+    if session.bind.dialect.name == 'mysql':
+        # UPDATE users, jobs SET ... WHERE users.id = jobs.user_id, both tables in one statement
+        result = await session.execute(
+            update(User)
+            .where(in_batch, User.id == Job.user_id, due)
+            .values({User.money: User.money + _PAYCHECK_AMOUNT, Job.paycheck_redeemed: now})
+            .execution_options(synchronize_session=False))
+        # The matched row count of a multi-table UPDATE adds up the users row and the jobs row of every user
+        return result.rowcount // 2
+
+    if not session.bind.dialect.update_returning:
+        raise NotImplementedError(f'The payroll needs UPDATE ... RETURNING on {session.bind.dialect.name}')
+    # Other databases can not set columns of two tables in one UPDATE, the jobs are claimed first and exactly the users
+    # they returned are paid, in the same transaction, so a concurrent /job paycheck can not pay them a second time
+    paid_ids = (await session.execute(
+        update(Job)
+        .where(due, Job.user_id.in_(select(User.id).where(in_batch)))
+        .values(paycheck_redeemed=now)
+        .returning(Job.user_id)
+        .execution_options(synchronize_session=False))).scalars().all()
+    if paid_ids:
+        await session.execute(
+            update(User)
+            .where(User.id.in_(paid_ids))
+            .values(money=User.money + _PAYCHECK_AMOUNT)
+            .execution_options(synchronize_session=False))
+    return len(paid_ids)
+
+
+class Payroll:
+    """Background task paying every due paycheck with a few set based UPDATEs instead of one command per user"""
+
+    def __init__(self, enabled: bool, batch_size: int):
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.users_paid = 0
+        self.users_per_second = 0.0
+        self.last_run: Union[datetime | None] = None
+        self._task: Union[asyncio.Task | None] = None
+
+    def start(self):
+        if not self.enabled or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run_periodically())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run_periodically(self):
+        while True:
+            try:
+                await self.run()
+            except Exception:
+                logger.exception('Running the payroll failed, retrying at the next interval')
+            await asyncio.sleep(PAYCHECK_INTERVAL.total_seconds())
+
+    async def run(self) -> int:
+        """Pay every employed user whose paycheck is due, returning how many were paid"""
+        started = perf_counter()
+        now = datetime.utcnow()
+        async with async_session() as session:
+            guild_ids = (await session.execute(select(User.guild_id).join(User.job).distinct())).scalars().all()
+        users_paid = 0
+        for guild_id in guild_ids:
+            users_paid += await self.pay_guild(guild_id, now)
+
+        seconds = perf_counter() - started
+        self.users_paid = users_paid
+        self.users_per_second = users_paid / seconds if seconds else 0.0
+        self.last_run = now
+        payroll_users_per_second.set(self.users_per_second)
+        logger.info('Payroll paid %d users in %d servers in %.2fs, %.0f users per second',
+                    users_paid, len(guild_ids), seconds, self.users_per_second)
+        return users_paid
+
+    async def pay_guild(self, guild_id: int, now: datetime) -> int:
+        users_paid = 0
+        last_id = 0
+        while True:
+            # One short transaction per batch, so the rows of a guild are never locked for long
+            async with async_session() as session:
+                batch = (await session.execute(
+                    select(User.id, User.discord_id)
+                    .join(User.job)
+                    .where(User.guild_id == guild_id, User.id > last_id)
+                    .order_by(User.id)
+                    .limit(self.batch_size))).all()
+                if not batch:
+                    return users_paid
+                batch_paid = await _pay_batch(session, guild_id, batch[0].id, batch[-1].id, now)
+                await session.commit()
+
+            if batch_paid:
+                # Not every user of the batch was due, dropping all of them is cheaper than finding out which
+                for row in batch:
+                    account_cache.invalidate(guild_id, row.discord_id)
+                leaderboards.evict(guild_id)
+            users_paid += batch_paid
+            last_id = batch[-1].id
+
+    def stats(self) -> dict:
+        return {
+            'enabled': self.enabled,
+            'last_run': self.last_run,
+            'users_paid': self.users_paid,
+            'users_per_second': self.users_per_second
+        }
+
+
+load_dotenv()
+payroll = Payroll(getenv('CASINO_AUTO_PAYROLL') == 'TRUE', int(getenv('CASINO_PAYROLL_BATCH_SIZE', 500)))